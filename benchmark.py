@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.corpus import CorpusGenerator, SHAPES
+from benchmarks.suite import BenchmarkSuite, report, compare, format_results, format_comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Code formatter for Java. Benchmarks on generated sources.')
+
+    parser.add_argument('--properties', type=str, default='schema.properties',
+                        help='Properties for formatter. "schema.properties" by default.')
+    parser.add_argument('--shapes', type=str, nargs='+', default=list(SHAPES), choices=list(SHAPES),
+                        metavar='SHAPE', help='Kinds of generated sources: {}. All of them by default.'.format(
+                            ', '.join(SHAPES)))
+    parser.add_argument('--size', type=int, default=256, help='Size of every generated source in kilobytes.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the source generator.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of every benchmark, the fastest is reported.')
+    parser.add_argument('--skip-main', help='Do not time main.py in a separate process.', action='store_true')
+    parser.add_argument('--output', type=str, help='Save results as JSON.')
+    parser.add_argument('--compare', type=str, nargs='+', metavar='JSON',
+                        help='Compare saved results with the results of this run, or two saved results.')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='Slowdown in percent reported as a regression, 10 by default.')
+    parser.add_argument('--write-corpus', type=str, metavar='DIRECTORY',
+                        help='Only write the generated sources to a directory.')
+
+    args = parser.parse_args()
+
+    if args.write_corpus is not None:
+        for shape in args.shapes:
+            CorpusGenerator(args.seed).write(os.path.join(args.write_corpus, shape), 1, args.size * 1024, shape)
+        return
+
+    if args.compare is not None and len(args.compare) > 2:
+        parser.error('--compare expects one or two files')
+
+    if args.compare is not None and len(args.compare) == 2:
+        new = load(args.compare[1])
+    else:
+        new = run(args)
+
+    if args.compare is not None:
+        comparisons = compare(load(args.compare[0]), new, args.threshold / 100)
+        print(format_comparisons(comparisons))
+        if any(c.regressed for c in comparisons):
+            sys.exit(1)
+
+
+def run(args) -> dict:
+    suite = BenchmarkSuite(os.path.abspath(args.properties), repeat=args.repeat, run_main=not args.skip_main)
+    corpora = {}
+    results = {}
+
+    for shape in args.shapes:
+        source = CorpusGenerator(args.seed).generate(args.size * 1024, shape)
+        corpora[shape] = {'seed': args.seed, 'bytes': len(source.encode('utf-8')), 'lines': source.count('\n')}
+        for name, result in suite.run(source).items():
+            results['{}/{}'.format(shape, name)] = result
+
+    print(format_results(results))
+
+    data = report(corpora, results)
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(data, file, indent=2)
+    return data
+
+
+def load(path: str) -> dict:
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import os
+import random
+from typing import List
+
+# Relative weights of the generated class members for every corpus shape.
+SHAPES = {
+    'mixed': {'fields': 3, 'methods': 4, 'nesting': 1, 'chains': 1, 'switch': 1, 'strings': 1, 'comments': 2},
+    'nesting': {'fields': 1, 'nesting': 6},
+    'chains': {'fields': 1, 'chains': 6},
+    'switch': {'fields': 1, 'switch': 6},
+    'strings': {'fields': 1, 'strings': 6},
+    'comments': {'fields': 1, 'methods': 1, 'comments': 6},
+}
+
+
+class CorpusGenerator:
+    # Produces syntactically plausible, deliberately badly formatted Java sources. The same seed always
+    # gives the same corpus, so runs on different machines or commits format the same input.
+
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+        self.names = 0
+
+    def generate(self, size: int, shape: str = 'mixed') -> str:
+        weights = SHAPES[shape]
+        kinds = list(weights)
+
+        parts = ['package com.example.generated;\n\nimport java.util.List;\nimport java.util.Map;\n\n',
+                 'public class {} {{\n'.format(self.name('Generated'))]
+        length = sum(len(part) for part in parts)
+        while length < size:
+            kind = self.random.choices(kinds, [weights[kind] for kind in kinds])[0]
+            member = getattr(self, kind)()
+            parts.append(member)
+            length += len(member)
+
+        parts.append('}\n')
+        return ''.join(parts)
+
+    def write(self, directory: str, files: int, size: int, shape: str = 'mixed') -> List[str]:
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for i in range(files):
+            path = os.path.join(directory, 'Generated{}.java'.format(i))
+            with open(path, 'w') as file:
+                file.write(self.generate(size, shape))
+            paths.append(path)
+        return paths
+
+    def name(self, prefix: str = 'value') -> str:
+        self.names += 1
+        return '{}{}'.format(prefix, self.names)
+
+    def space(self) -> str:
+        return self.random.choice(['', ' ', ' ', '   '])
+
+    def expression(self, depth: int = 0) -> str:
+        r = self.random.random()
+        if depth > 2 or r < 0.3:
+            return self.random.choice([self.name('v'), str(self.random.randrange(1000)), 'true', 'null',
+                                       '"{}"'.format(self.name('s'))])
+        if r < 0.7:
+            operator = self.random.choice(['+', '-', '*', '/', '==', '!=', '&&', '||', '<', '>='])
+            return '{}{}{}{}{}'.format(self.expression(depth + 1), self.space(), operator, self.space(),
+                                       self.expression(depth + 1))
+        return '{}({}{})'.format(self.name('call'), self.space(), self.expression(depth + 1))
+
+    def statement(self, indent: str) -> str:
+        return '{}int {}{}={}{};\n'.format(indent, self.name(), self.space(), self.space(), self.expression())
+
+    def fields(self) -> str:
+        modifiers = self.random.choice(['private', 'protected static', 'public  final', 'private static final'])
+        return '    {}   int {} ={}{};\n'.format(modifiers, self.name('field'), self.space(), self.expression())
+
+    def methods(self) -> str:
+        body = ''.join(self.statement('        ') for i in range(self.random.randint(2, 8)))
+        return '\n    public {}  void {}(int a,int  b){}{{\n{}    }}\n'.format(
+            self.random.choice(['', 'static', 'synchronized']), self.name('method'), self.space(), body)
+
+    def nesting(self) -> str:
+        depth = self.random.randint(6, 16)
+        opening = []
+        closing = []
+        for level in range(depth):
+            indent = '    ' * (level + 2)
+            header = self.random.choice(['if({})', 'while ({})', 'for(int i{0}=0;i{0}<10;i{0}++)'])
+            opening.append('{}{} {{\n{}'.format(indent, header.format(self.expression(2) if '{}' in header
+                                                                      else level), self.statement(indent + '    ')))
+            closing.append('{}}}\n'.format(indent))
+        return '\n    void {}() {{\n{}{}    }}\n'.format(self.name('nested'), ''.join(opening),
+                                                         ''.join(reversed(closing)))
+
+    def chains(self) -> str:
+        calls = ''.join('.{}({})'.format(self.name('with'), ','.join(self.expression(2) for i in range(
+            self.random.randint(0, 3)))) for j in range(self.random.randint(15, 60)))
+        return '\n    Object {}() {{\n        return builder(){}.build();\n    }}\n'.format(self.name('chain'), calls)
+
+    def switch(self) -> str:
+        cases = ''.join('            case {}:\n                {}break;\n'.format(
+            i, self.statement('').strip() + ' ') for i in range(self.random.randint(100, 500)))
+        return '\n    int {}(int key) {{\n        switch(key) {{\n{}            default:\n' \
+               '                return 0;\n        }}\n        return 1;\n    }}\n'.format(self.name('lookup'), cases)
+
+    def strings(self) -> str:
+        text = ' '.join(self.name('word') for i in range(self.random.randint(20, 300)))
+        return '    String {} = "{}" + "{}";\n'.format(self.name('text'), text, self.name('suffix'))
+
+    def comments(self) -> str:
+        lines = ''.join('     * {}\n'.format(' '.join(self.name('note') for i in range(self.random.randint(3, 12))))
+                        for j in range(self.random.randint(2, 10)))
+        return '\n    /**\n{}     */\n    // {}\n    void {}() {{ }}\n'.format(lines, self.name('todo'),
+                                                                               self.name('documented'))
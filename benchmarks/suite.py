@@ -0,0 +1,173 @@
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional
+
+from formatter import __version__
+from formatter.formatter import Formatter
+from formatter.sequence import TokenSequence
+from formatter.stages import STAGES
+from lexer.lexer import Lexer, ENGINES
+from util.util import Properties
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+Comparison = namedtuple('Comparison', ['name', 'old', 'new', 'ratio', 'regressed'])
+
+
+class BenchmarkSuite:
+    # Times the lexer engines, every enabled stage on the output of the stages before it, the whole
+    # formatter and a main.py process on one source. The best of `repeat` runs is reported, memory is
+    # measured in one more run under tracemalloc so that tracing does not slow down the timed ones.
+
+    def __init__(self, properties_path: str, repeat: int = 3, run_main: bool = True):
+        self.properties_path = properties_path
+        self.p = Properties(properties_path)
+        self.repeat = repeat
+        self.run_main = run_main
+
+    def run(self, source: str) -> Dict[str, dict]:
+        tokens = list(Lexer.get_tokens(source))
+        size = len(source.encode('utf-8'))
+        results = {}
+
+        def record(name, function, setup=lambda: None, count=len(tokens)):
+            results[name] = self.measure(function, setup, count, size)
+
+        for engine in ENGINES:
+            record('lexer.' + engine, lambda argument: list(Lexer.get_tokens(source, engine)))
+
+        stage_input = tokens
+        for stage_type in STAGES:
+            stage = stage_type(self.p, [])
+            if not stage.enabled:
+                continue
+
+            record('stage.' + stage_type.__name__, lambda argument: stage_type(self.p, []).run(argument),
+                   lambda: TokenSequence(BenchmarkSuite.copy_tokens(stage_input)), len(stage_input))
+            stage_input = list(stage.run(TokenSequence(BenchmarkSuite.copy_tokens(stage_input))))
+
+        record('format.fused', lambda argument: Formatter.format(source, self.p))
+        record('format.legacy', lambda argument: Formatter.format(source, self.p, fused=False))
+
+        if self.run_main:
+            results['main'] = self.measure_main(source, len(tokens), size)
+
+        return results
+
+    def measure(self, function: Callable, setup: Callable, tokens: int, size: int) -> dict:
+        best = None
+        for i in range(self.repeat):
+            argument = setup()
+            start = time.perf_counter()
+            function(argument)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        argument = setup()
+        tracemalloc.start()
+        try:
+            function(argument)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return BenchmarkSuite.rates(best, tokens, size, peak)
+
+    def measure_main(self, source: str, tokens: int, size: int) -> dict:
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'Input.java')
+            output_path = os.path.join(directory, 'Output.java')
+            with open(input_path, 'w') as file:
+                file.write(source)
+
+            command = [sys.executable, os.path.join(ROOT_DIR, 'main.py'), input_path, self.properties_path,
+                       '--output', output_path, '--no-daemon']
+            best, peak = None, None
+            for i in range(self.repeat):
+                start = time.perf_counter()
+                child_peak = BenchmarkSuite.run_child(command)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+                if child_peak is not None:
+                    peak = max(peak or 0, child_peak)
+
+        return BenchmarkSuite.rates(best, tokens, size, peak)
+
+    @staticmethod
+    def run_child(command: List[str]) -> Optional[int]:
+        # Returns the largest resident set of this child alone, RUSAGE_CHILDREN would be the largest of all
+        # children so far. None where the usage of a single child is not available.
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, cwd=ROOT_DIR)
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # Kilobytes on Linux.
+            peak = usage.ru_maxrss * 1024
+        else:
+            process.wait()
+            peak = None
+
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+        return peak
+
+    @staticmethod
+    def rates(seconds: float, tokens: int, size: int, peak: Optional[int]) -> dict:
+        return {
+            'seconds': seconds,
+            'tokens_per_sec': tokens / seconds if seconds else None,
+            'mb_per_sec': size / seconds / (1024 * 1024) if seconds else None,
+            'peak_memory': peak,
+        }
+
+    @staticmethod
+    def copy_tokens(tokens: List) -> List:
+        # Stages change tokens in place, every run gets its own.
+        return [type(token)(token.value, token.position) for token in tokens]
+
+
+def report(corpora: Dict[str, dict], results: Dict[str, dict]) -> dict:
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpora': corpora,
+        'results': results,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = 0.1) -> List[Comparison]:
+    # A benchmark regressed if it got slower by more than `threshold`, e.g. 0.1 for 10%.
+    comparisons = []
+    for name, result in new['results'].items():
+        previous = old['results'].get(name)
+        if previous is None:
+            continue
+
+        ratio = result['seconds'] / previous['seconds']
+        comparisons.append(Comparison(name, previous['seconds'], result['seconds'], ratio, ratio > 1 + threshold))
+    return comparisons
+
+
+def format_results(results: Dict[str, dict]) -> str:
+    lines = ['{:<40} {:>10} {:>14} {:>10} {:>12}'.format('benchmark', 'seconds', 'tokens/sec', 'MB/sec', 'peak MB')]
+    for name, result in results.items():
+        peak = result['peak_memory']
+        lines.append('{:<40} {:>10.4f} {:>14.0f} {:>10.2f} {:>12}'.format(
+            name, result['seconds'], result['tokens_per_sec'], result['mb_per_sec'],
+            '-' if peak is None else '{:.1f}'.format(peak / (1024 * 1024))))
+    return '\n'.join(lines)
+
+
+def format_comparisons(comparisons: List[Comparison]) -> str:
+    lines = ['{:<40} {:>10} {:>10} {:>8}'.format('benchmark', 'old', 'new', 'change')]
+    for c in comparisons:
+        lines.append('{:<40} {:>10.4f} {:>10.4f} {:>+7.1f}%{}'.format(
+            c.name, c.old, c.new, (c.ratio - 1) * 100, '  REGRESSION' if c.regressed else ''))
+    return '\n'.join(lines)
@@ -0,0 +1,40 @@
+import argparse
+import os
+
+from formatter.client import DaemonClient, DaemonError, default_socket_path, private_directory, socket_directory
+from formatter.daemon import FormatterDaemon
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Code formatter for Java. Formatting daemon.')
+
+    parser.add_argument('--socket', type=str,
+                        help='Unix socket to listen on. $JAVA_FORMATTER_SOCKET or a file in $XDG_RUNTIME_DIR, or in a '
+                             'directory of the user in the temporary directory, by default.')
+    parser.add_argument('--cache', type=str, help='Directory for cached results of already formatted files.')
+    parser.add_argument('--cache-size', type=int, default=64, help='Cache size limit in megabytes, 64 by default.')
+    parser.add_argument('--stop', help='Stop the daemon listening on the socket.', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.socket is None:
+        if 'JAVA_FORMATTER_SOCKET' not in os.environ:
+            try:
+                private_directory(socket_directory())
+            except DaemonError as e:
+                parser.error(str(e))
+        args.socket = default_socket_path()
+
+    if args.stop:
+        client = DaemonClient.connect(args.socket)
+        if client is None:
+            parser.error('no daemon is listening on {}'.format(args.socket))
+        with client:
+            client.shutdown()
+        return
+
+    FormatterDaemon(args.socket, cache_dir=args.cache, cache_size=args.cache_size * 1024 * 1024).serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+__version__ = '0.2.0'
+# Incremented whenever the same source and properties are formatted differently: by the one-pass
+# SplitLongLines (2).
+FORMAT_VERSION = 2
+# Part of every cache key and the version a daemon reports, so that results of another formatter are
+# never reused.
+OUTPUT_VERSION = '{}/{}'.format(__version__, FORMAT_VERSION)
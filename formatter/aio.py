@@ -0,0 +1,112 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, Awaitable, Iterable, List, Optional
+
+from formatter.formatter import CompiledFormatter
+from util.util import SourceFile, Properties, FileResult, FormattingResult
+
+
+def _format(source: str, p: Properties, fused: bool) -> FormattingResult:
+    # Runs in the executor, worker processes keep their compiled formatters between calls.
+    return CompiledFormatter.compile(p, fused).format(source)
+
+
+async def format_async(source: str, p: Properties, executor: Optional[Executor] = None,
+                       timeout: Optional[float] = None, fused: bool = True) -> FormattingResult:
+    # Formats in `executor`, the default thread pool of the loop if None. A timed out or cancelled request
+    # that has not started yet is dropped from the executor, a running one is left to finish.
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(executor, _format, source, p, fused), timeout)
+
+
+class AsyncFormatter:
+    # Formatting service for event loops. At most `max_concurrency` requests are handed to the executor at a
+    # time, the rest wait for a free slot, so a burst of requests can't queue up unbounded work. `timeout` is
+    # in seconds and includes the wait for a slot. Without an executor a process pool is started and shut
+    # down on close().
+
+    def __init__(self, p: Properties, executor: Optional[Executor] = None, max_concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None, fused: bool = True):
+        self.p = p
+        self.fused = fused
+        self.timeout = timeout
+        self.own_executor = executor is None
+        self.executor = executor if executor is not None else ProcessPoolExecutor()
+        self.max_concurrency = max_concurrency or (os.cpu_count() or 1) * 2
+        # Created on first use, inside the running loop.
+        self.slots = None
+
+    async def format(self, source: str, timeout: Optional[float] = None) -> FormattingResult:
+        return await self._limit(self._submit(source), timeout)
+
+    async def format_many(self, sources: Iterable[str]) -> AsyncIterator[FormattingResult]:
+        # Yields results in the order of `sources`, taking the next source only when a slot is free.
+        async for result in self._bounded(self.format, sources):
+            yield result
+
+    async def format_all(self, sources: Iterable[str]) -> List[FormattingResult]:
+        return [result async for result in self.format_many(sources)]
+
+    async def format_file(self, path: str, write: bool = True, timeout: Optional[float] = None) -> FileResult:
+        try:
+            file = SourceFile(path)
+            source = await AsyncFormatter.read(file)
+            result = await self.format(source, timeout)
+
+            changed = result.code != source
+            if changed and write:
+                await AsyncFormatter.write(file, result.code)
+
+            return FileResult(path, changed, result.errors, None)
+        except Exception as e:
+            return FileResult(path, False, [], '{}: {}'.format(type(e).__name__, e))
+
+    async def format_files(self, paths: Iterable[str], write: bool = True) -> AsyncIterator[FileResult]:
+        async for result in self._bounded(lambda path: self.format_file(path, write), paths):
+            yield result
+
+    async def close(self):
+        if self.own_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self) -> 'AsyncFormatter':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @staticmethod
+    async def read(file: SourceFile) -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, file.read_all)
+
+    @staticmethod
+    async def write(file: SourceFile, text: str):
+        # Written in the encoding read_all() detected.
+        await asyncio.get_running_loop().run_in_executor(None, file.replace_all, text)
+
+    async def _submit(self, source: str) -> FormattingResult:
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_concurrency)
+
+        async with self.slots:
+            return await format_async(source, self.p, self.executor, None, self.fused)
+
+    def _limit(self, request: Awaitable, timeout: Optional[float]) -> Awaitable:
+        return asyncio.wait_for(request, self.timeout if timeout is None else timeout)
+
+    async def _bounded(self, function, items: Iterable) -> AsyncIterator:
+        # Keeps at most max_concurrency tasks in flight, closing the iterator early cancels them.
+        pending = deque()
+        try:
+            for item in items:
+                if len(pending) >= self.max_concurrency:
+                    yield await pending.popleft()
+                pending.append(asyncio.ensure_future(function(item)))
+
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from formatter import OUTPUT_VERSION
+from lexer.lexer import Lexer
+from lexer.table import TokenTable
+from lexer.token import Token, KINDS
+from util.util import Properties, FormattingResult
+
+
+class DiskCache:
+    # Entries stored on disk, one file per key. Entries are written to a temporary file and moved into
+    # place, so processes sharing the directory never read a partially written entry. Caches sharing a
+    # directory share its size limit.
+    EVICT_INTERVAL = 256
+
+    def __init__(self, directory: str, max_size: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        self.writes += 1
+        if self.writes % self.EVICT_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_size:
+            return
+
+        # Least recently used entries go first, until the cache is back to 90% of its limit.
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+
+class ResultCache(DiskCache):
+    # Formatting results, keyed by the source and the properties.
+
+    @staticmethod
+    def key(content: str, p: Properties) -> str:
+        digest = hashlib.sha256()
+        digest.update(OUTPUT_VERSION.encode())
+        digest.update(b'\0')
+        digest.update(ResultCache._properties_key(p))
+        digest.update(b'\0')
+        digest.update(content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _properties_key(p: Properties) -> bytes:
+        return json.dumps(sorted(p.map.items())).encode()
+
+    def get(self, content: str, p: Properties) -> Optional[FormattingResult]:
+        path = self._path(self.key(content, p))
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        code = content if entry['code'] is None else entry['code']
+        return FormattingResult(code, entry['errors'])
+
+    def put(self, content: str, p: Properties, result: FormattingResult):
+        entry = {
+            'code': None if result.code == content else result.code,
+            'errors': result.errors,
+        }
+        self.write(self._path(self.key(content, p)), json.dumps(entry).encode('utf-8'))
+
+
+class TokenCache(DiskCache):
+    # Lexer output in the binary TokenTable form, keyed by the source alone, so that formatting with other
+    # properties skips lexing.
+
+    @staticmethod
+    def key(content: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(OUTPUT_VERSION.encode())
+        digest.update(b'\0tokens\0')
+        digest.update(content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, content: str) -> Optional[TokenTable]:
+        path = self._path(self.key(content)) + '.tokens'
+        try:
+            table = TokenTable.load(content, path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return table
+
+    def put(self, content: str, table: TokenTable):
+        self.write(self._path(self.key(content)) + '.tokens', table.to_bytes())
+
+    def tokens(self, content: str) -> Iterable[Token]:
+        table = self.get(content)
+        return table if table is not None else self._lex(content)
+
+    def _lex(self, content: str) -> Iterator[Token]:
+        # The lexer's own tokens, the table is filled from their spans on the way and stored once all were read.
+        table = TokenTable(content)
+        append = table.append
+        for token, start, end in Lexer.create(content).spans:
+            append(KINDS[type(token)], start, end, token.position)
+            yield token
+        self.put(content, table)
@@ -0,0 +1,116 @@
+import json
+import os
+import socket
+import stat
+import tempfile
+from typing import Optional
+
+from util.util import FormattingResult, FileResult
+
+# Only the standard library and util are imported here, so a client does not pay for loading the formatter.
+
+
+class DaemonError(Exception):
+
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def socket_directory() -> str:
+    # Only the user can enter $XDG_RUNTIME_DIR, the directory in the temporary directory is made so by
+    # private_directory().
+    return os.environ.get('XDG_RUNTIME_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'java-formatter-{}'.format(os.getuid()))
+
+
+def default_socket_path() -> Optional[str]:
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    return os.environ.get('JAVA_FORMATTER_SOCKET') or os.path.join(socket_directory(), 'java-formatter.sock')
+
+
+def private_directory(path: str) -> str:
+    # Created if missing. It must belong to the user and be closed to everyone else, so that no one else can
+    # put a socket of their own in it.
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise DaemonError('{} is not a directory private to the user.'.format(path))
+    return path
+
+
+class DaemonClient:
+    # Requests and responses are JSON objects, one per line, any number of them over one connection.
+
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.reader = connection.makefile('rb')
+
+    @staticmethod
+    def connect(socket_path: Optional[str] = None, timeout: Optional[float] = None) -> Optional['DaemonClient']:
+        # Returns None if no daemon of this user is listening on the socket.
+        socket_path = socket_path or default_socket_path()
+        if socket_path is None:
+            return None
+        try:
+            if os.stat(socket_path).st_uid != os.getuid():
+                return None
+        except OSError:
+            return None
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            connection.close()
+            return None
+        return DaemonClient(connection)
+
+    def request(self, **message) -> dict:
+        self.connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise DaemonError('Daemon closed the connection.')
+
+        response = json.loads(line.decode('utf-8'))
+        if 'failure' in response:
+            raise DaemonError(response['failure'])
+        return response
+
+    def format(self, properties_path: str, content: Optional[str] = None, path: Optional[str] = None,
+               output: Optional[str] = None) -> FormattingResult:
+        # The daemon writes the code to `output` if given, in the encoding of the file at `path`.
+        response = self.request(command='format', properties=os.path.abspath(properties_path), content=content,
+                                path=os.path.abspath(path) if path is not None else None,
+                                output=os.path.abspath(output) if output is not None else None)
+        return FormattingResult(response['code'], response['errors'])
+
+    def format_file(self, properties_path: str, path: str) -> FileResult:
+        # The daemon reads the file and writes it back if the formatted code differs.
+        try:
+            response = self.request(command='format', properties=os.path.abspath(properties_path),
+                                    path=os.path.abspath(path), write=True)
+        except DaemonError as e:
+            return FileResult(path, False, [], str(e))
+        return FileResult(path, response['changed'], response['errors'], None)
+
+    def ping(self) -> str:
+        return self.request(command='ping')['version']
+
+    def shutdown(self):
+        self.request(command='shutdown')
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,147 @@
+import json
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from formatter import OUTPUT_VERSION
+from formatter.cache import ResultCache, TokenCache
+from formatter.client import DaemonClient
+from formatter.formatter import Formatter
+from util.util import SourceFile, Properties, FormattingResult
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            request = {}
+            try:
+                request = json.loads(line.decode('utf-8'))
+                response = self.server.handle_request_message(request)
+            except Exception as e:
+                response = {'failure': '{}: {}'.format(type(e).__name__, e)}
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+            if request.get('command') == 'shutdown':
+                # Only once answered, the process may exit as soon as the server stops.
+                threading.Thread(target=self.server.shutdown).start()
+
+
+class FormatterDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # Keeps parsed properties and recent results between requests, every connection gets its own thread.
+    daemon_threads = True
+    MEMORY_CACHE_SIZE = 256
+
+    def __init__(self, socket_path: str, cache_dir: Optional[str] = None, cache_size: int = 64 * 1024 * 1024):
+        self.socket_path = socket_path
+        self.cache = ResultCache(cache_dir, cache_size) if cache_dir is not None else None
+        # Lexer output outlives results when properties change.
+        self.tokens = TokenCache(cache_dir, cache_size) if cache_dir is not None else None
+
+        self.lock = threading.Lock()
+        self.properties = {}
+        self.results = OrderedDict()
+
+        FormatterDaemon.remove_stale_socket(socket_path)
+        super().__init__(socket_path, RequestHandler)
+
+    def server_bind(self):
+        # Bound under a umask, so that the socket is never open to other users, not even before a chmod.
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    @staticmethod
+    def remove_stale_socket(socket_path: str):
+        client = DaemonClient.connect(socket_path)
+        if client is not None:
+            client.close()
+            raise RuntimeError('A daemon is already listening on {}.'.format(socket_path))
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+    def serve(self):
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def handle_request_message(self, request: dict) -> dict:
+        command = request.get('command')
+
+        if command == 'ping':
+            return {'version': OUTPUT_VERSION}
+
+        if command == 'shutdown':
+            return {}
+
+        if command == 'format':
+            return self.format_request(request)
+
+        raise ValueError('Unknown command {}.'.format(command))
+
+    def format_request(self, request: dict) -> dict:
+        p = self.get_properties(request['properties'])
+        path = request.get('path')
+
+        file = SourceFile(path) if path is not None else None
+        content = request.get('content')
+        if content is None:
+            content = file.read_all()
+
+        result = self.format(content, p)
+
+        output = request.get('output')
+        if output is not None:
+            SourceFile(output, file.encoding if file is not None else None).replace_all(result.code)
+
+        if not request.get('write'):
+            return {'code': result.code, 'errors': result.errors}
+
+        changed = result.code != content
+        if changed:
+            file.replace_all(result.code)
+        return {'changed': changed, 'errors': result.errors}
+
+    def get_properties(self, path: str) -> Properties:
+        # Parsed again only when the file was modified since the last request that used it.
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            entry = self.properties.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        p = Properties(path)
+        with self.lock:
+            self.properties[path] = (mtime, p)
+        return p
+
+    def format(self, content: str, p: Properties) -> FormattingResult:
+        key = ResultCache.key(content, p)
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+                return result
+
+        result = self.cache.get(content, p) if self.cache is not None else None
+        if result is None:
+            result = Formatter.format_tokens(self.tokens.tokens(content), p) if self.tokens is not None else \
+                Formatter.format(content, p)
+            if self.cache is not None:
+                self.cache.put(content, p, result)
+
+        with self.lock:
+            self.results[key] = result
+            if len(self.results) > self.MEMORY_CACHE_SIZE:
+                self.results.popitem(last=False)
+        return result
@@ -0,0 +1,79 @@
+from collections import deque
+from typing import Iterable, List
+
+from util.util import TextEdit
+
+
+class EditCollector:
+    # Turns the formatted token stream back into edits of the original source. Stages keep the
+    # original token objects and only add, drop or replace whitespace, line breaks and comments
+    # around them, so every original token that reaches the output unchanged anchors the text
+    # between two edits.
+
+    def __init__(self, source: str):
+        self.source = source
+        self.edits = []
+
+        self.pending = deque()
+        self.pending_ids = set()
+
+        self.last_end = 0
+        self.replacement = []
+
+    def __setstate__(self, state):
+        # Copies of the collector get copies of the pending tokens, so their ids have to be collected again.
+        self.__dict__.update(state)
+        self.pending_ids = {id(token) for token, start, end in self.pending}
+
+    def track(self, spans: Iterable) -> Iterable:
+        for token, start, end in spans:
+            self.pending.append((token, start, end))
+            self.pending_ids.add(id(token))
+            yield token
+
+    def add(self, tokens: Iterable):
+        for token in tokens:
+            if id(token) in self.pending_ids:
+                start, end = self._anchor(token)
+                if token.value == self.source[start:end]:
+                    self._edit(start)
+                    self.last_end = end
+                    continue
+
+            self.replacement.append(token.value)
+
+    def close(self) -> List[TextEdit]:
+        self.pending.clear()
+        self.pending_ids.clear()
+        self._edit(len(self.source))
+        return self.edits
+
+    def _anchor(self, token):
+        while True:
+            original, start, end = self.pending.popleft()
+            self.pending_ids.discard(id(original))
+            if original is token:
+                return start, end
+
+    def _edit(self, offset):
+        old = self.source[self.last_end:offset]
+        new = ''.join(self.replacement)
+        if old != new:
+            self.edits.append(TextEdit(self.last_end, old, new))
+        self.replacement = []
+
+
+def apply_edits(source: str, edits: Iterable[TextEdit]) -> str:
+    result = []
+    position = 0
+
+    for edit in sorted(edits, key=lambda e: e.offset):
+        if edit.offset < position or source[edit.offset:edit.offset + len(edit.old)] != edit.old:
+            raise ValueError('Edit at {} does not match the source.'.format(edit.offset))
+
+        result.append(source[position:edit.offset])
+        result.append(edit.new)
+        position = edit.offset + len(edit.old)
+
+    result.append(source[position:])
+    return ''.join(result)
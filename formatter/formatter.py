@@ -1,448 +1,223 @@
-from typing import List
-
-from formatter.util import TokenUtils
-from lexer.lexer import Lexer
+import time
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional
+
+from formatter.edits import EditCollector, apply_edits
+from formatter.incremental import RangeFormatter
+from formatter.pipeline import FusedPipeline
+from formatter.profile import Observer, StageStats, CountingTokenSequence, profile_tokens
+from formatter.sequence import TokenSequence
+from formatter.stages import *
+from lexer.lexer import Lexer, LineIndex
+from lexer.stream import StreamLexer
 from lexer.token import *
-from util.util import Properties, FormattingResult
+from util.util import Properties, FormattingResult, Difference
 
 
-class Formatter:
+class CompiledFormatter:
+    # Formats any number of sources with the same properties. Stages that the properties switch off are
+    # dropped once here instead of for every source; stages keep state, so each source still gets new ones.
 
-    @staticmethod
-    def format(file_content: str, p: Properties) -> FormattingResult:
-        tokens = list(Lexer.get_tokens(file_content))
-        errors = []
-
-        formatters = (
-            Formatter.clear_spaces,
-            Formatter.replace_multiple_spaces,
-            Formatter.spaces_near_operators,
-            Formatter.space_after_comma,
-            Formatter.clear_line_breaks,
-            Formatter.line_break_after_semicolon,
-            Formatter.format_block_expressions,
-            Formatter.curly_braces_formatter,
-            Formatter.split_long_lines,
-            Formatter.remove_redundant_line_breaks,
-        )
-
-        for f in formatters:
-            tokens = f(tokens, p, errors)
-
-        return FormattingResult(''.join(token.value for token in tokens), errors)
+    def __init__(self, p: Properties, fused: bool = True):
+        self.p = p
+        self.fused = fused
+        self.stages = tuple(stage for stage in STAGES if stage(p, []).enabled)
 
     @staticmethod
-    def curly_braces_formatter(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
+    @lru_cache(maxsize=16)
+    def compile(p: Properties, fused: bool = True) -> 'CompiledFormatter':
+        # Properties are immutable and hashable, so equal ones share a formatter.
+        return CompiledFormatter(p, fused)
+
+    def format(self, file_content: str, observer: Optional[Observer] = None) -> FormattingResult:
+        return self.format_tokens(Lexer.get_tokens(file_content), observer)
+
+    def format_tokens(self, tokens: Iterable[Token], observer: Optional[Observer] = None) -> FormattingResult:
+        # Accepts any token stream, e.g. a TokenTable that materializes tokens one at a time.
+        stages = [stage(self.p, []) for stage in self.stages]
+
+        if observer is not None:
+            lexer_stats = StageStats('Lexer')
+            tokens = profile_tokens(tokens, lexer_stats)
+
+        if self.fused:
+            pipeline = FusedPipeline(stages, profile=observer is not None)
+            code = ''.join(token.value for token in pipeline.run(tokens))
+            stats = pipeline.stats
+        elif observer is None:
+            tokens = TokenSequence(tokens)
+            for stage in stages:
+                tokens = stage.run(tokens)
+            code = ''.join(token.value for token in tokens)
+        else:
+            tokens = CountingTokenSequence(tokens)
+            stats = [CompiledFormatter._run_profiled(stage, tokens) for stage in stages]
+            code = ''.join(token.value for token in tokens)
+
+        if observer is not None:
+            for s in [lexer_stats] + stats:
+                observer(s)
+
+        return FormattingResult(code, [error for stage in stages for error in stage.errors])
+
+    def format_many(self, sources: Iterable[str]) -> Iterator[FormattingResult]:
+        for source in sources:
+            yield self.format(source)
+
+    def check(self, file_content: str) -> Optional[Difference]:
+        # Compares the output with the source token by token as it is produced, without building it, and
+        # stops at the first token that differs. None if the source is already formatted.
+        stages = [stage(self.p, []) for stage in self.stages]
+        tokens = FusedPipeline(stages).run(Lexer.get_tokens(file_content))
+
+        offset = 0
+        for token in tokens:
+            value = token.value
+            if not file_content.startswith(value, offset):
+                return CompiledFormatter._difference(file_content, offset, value, tokens)
+            offset += len(value)
+
+        if offset != len(file_content):
+            return CompiledFormatter._difference(file_content, offset, '', tokens)
+        return None
 
-        if not p.format_curly_braces:
-            return tokens
+    @staticmethod
+    def _difference(file_content: str, offset: int, value: str, tokens: Iterator[Token]) -> Difference:
+        mismatch = offset
+        while mismatch - offset < len(value) and mismatch < len(file_content) \
+                and value[mismatch - offset] == file_content[mismatch]:
+            mismatch += 1
+
+        lines = LineIndex(file_content)
+        line = lines.line(mismatch)
+        line_start = lines.start(line)
+        original = lines.text(line)
+
+        # The rest of the formatted line is produced only now.
+        formatted = [file_content[line_start:offset], value]
+        while '\n' not in formatted[-1]:
+            token = next(tokens, None)
+            if token is None:
+                break
+            formatted.append(token.value)
+        formatted = ''.join(formatted).split('\n', 1)[0]
+
+        return Difference(line, mismatch - line_start + 1, original, formatted)
 
-        indent = 0
-        i = 0
-        skip_to_line_break = False
+    @staticmethod
+    def _run_profiled(stage: Stage, tokens: CountingTokenSequence) -> StageStats:
+        stats = tokens.stats = StageStats(type(stage).__name__)
+        stats.tokens_in = len(tokens)
 
-        while i < len(tokens):
-            token = tokens[i]
+        start = time.perf_counter()
+        stage.run(tokens)
+        stats.seconds = time.perf_counter() - start
 
-            if token.value == '{':
-                if (i > 2 and TokenUtils.has_before(tokens, i, Whitespace) and TokenUtils.has_before(tokens, i - 1,
-                                                                                                     LineBreak)) or \
-                        (i > 1 and TokenUtils.has_before(tokens, i, LineBreak)) or \
-                        i == 0:
-                    i += TokenUtils.add_or_replace_before(tokens, i, Whitespace(' ' * indent))
-                else:
-                    i += TokenUtils.add_or_replace_before(tokens, i, Whitespace(' '))
+        stats.tokens_out = len(tokens)
+        return stats
 
-                indent += p.indent
-                TokenUtils.add_or_replace_after(tokens, i, LineBreak('\n'))
 
-            elif token.value == '}':
-                indent = indent - p.indent
-                if indent < 0:
-                    errors.append('Unexpected closing bracket at {}, set indent to 0.'.format(token.position))
-                    indent = 0
+class Formatter:
 
-                i += TokenUtils.add_or_replace_before(tokens, i, LineBreak('\n'), Whitespace(' ' * indent))
+    @staticmethod
+    def format(file_content: str, p: Properties, fused: bool = True,
+               observer: Optional[Observer] = None) -> FormattingResult:
+        return CompiledFormatter.compile(p, fused).format(file_content, observer)
 
-            elif skip_to_line_break:
-                if token.value == '\n':
-                    skip_to_line_break = False
+    @staticmethod
+    def format_tokens(tokens: Iterable[Token], p: Properties, fused: bool = True,
+                      observer: Optional[Observer] = None) -> FormattingResult:
+        return CompiledFormatter.compile(p, fused).format_tokens(tokens, observer)
 
-            elif TokenUtils.is_any_line_start(token) or (isinstance(token, Comment) and token.value.startswith('//')):
-                skip_to_line_break = True
-                if token.value in ['else', 'catch', 'finally']:
-                    i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                    i += TokenUtils.remove_before_if_exists(tokens, i, LineBreak)
-                    i += TokenUtils.add_or_replace_before(tokens, i, Whitespace(' '))
-                else:
-                    i += TokenUtils.add_or_replace_before(tokens, i, Whitespace(' ' * indent))
+    @staticmethod
+    def format_many(sources: Iterable[str], p: Properties, fused: bool = True) -> Iterator[FormattingResult]:
+        # Yields the result of every source as soon as it is formatted.
+        return CompiledFormatter.compile(p, fused).format_many(sources)
 
-            elif token.value in ['.', '::']:
-                skip_to_line_break = True
-                i += TokenUtils.add_or_replace_before(tokens, i,
-                                                      Whitespace(' ' * (indent + p.split_indent)))
+    @staticmethod
+    def check(file_content: str, p: Properties) -> Optional[Difference]:
+        return CompiledFormatter.compile(p).check(file_content)
 
-            elif not p.preserve_comment_indent and isinstance(token, Comment) and token.value.startswith('/*'):
-                tokens[i] = TokenUtils.format_comment(token, indent)
-                i += TokenUtils.add_or_replace_before(tokens, i, Whitespace(' ' * indent))
+    @staticmethod
+    def format_stream(reader, writer, p: Properties, chunk_size: int = StreamLexer.CHUNK_SIZE,
+                      observer: Optional[Observer] = None, encoding: str = 'utf-8') -> FormattingResult:
+        # Reads from a text or binary file object (or an mmap, see SourceFile.mapped) and writes formatted
+        # code as it is produced. Binary input is decoded with `encoding`.
+        lexer = StreamLexer(reader, chunk_size=chunk_size, encoding=encoding)
+        stages = [stage(p, []) for stage in STAGES]
+        tokens = lexer.tokens
 
-                if p.line_break_after_comment:
-                    TokenUtils.add_or_replace_after(tokens, i, LineBreak('\n'))
+        if observer is not None:
+            lexer_stats = StageStats('Lexer')
+            tokens = profile_tokens(tokens, lexer_stats)
 
-            i += 1
+        pipeline = FusedPipeline(stages, profile=observer is not None)
+        for batch in pipeline.batches(tokens):
+            writer.write(''.join(token.value for token in batch))
 
-        if indent > 0:
-            errors.append('Expected closing bracket at the end.')
+        if observer is not None:
+            for s in [lexer_stats] + pipeline.stats:
+                observer(s)
 
-        return tokens
+        return FormattingResult(None, [error for stage in stages for error in stage.errors])
 
     @staticmethod
-    def spaces_within_keywords(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
+    def format_edits(file_content: str, p: Properties, apply: bool = False) -> FormattingResult:
+        collector = EditCollector(file_content)
+        stages = [stage(p, []) for stage in STAGES]
 
-        if not p.spaces_within_keywords:
-            return tokens
+        collector.add(FusedPipeline(stages).run(collector.track(Lexer.create(file_content).spans)))
+        edits = collector.close()
 
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
+        code = apply_edits(file_content, edits) if apply else None
+        return FormattingResult(code, [error for stage in stages for error in stage.errors], edits)
 
-            if isinstance(token, Keyword):
-                shift = TokenUtils.add_or_replace_before(tokens, i, Whitespace(' '))
-                i += shift
+    @staticmethod
+    def format_range(file_content: str, start_line: int, end_line: int, p: Properties,
+                     apply: bool = False) -> FormattingResult:
+        # Keep a RangeFormatter around instead to reuse its checkpoints between edits of the same file.
+        return RangeFormatter(p).format_range(file_content, start_line, end_line, apply)
 
-            i += 1
+    @staticmethod
+    def curly_braces_formatter(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
+        return CurlyBracesFormatter(p, errors).run(tokens)
 
-        return tokens
+    @staticmethod
+    def spaces_within_keywords(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
+        return SpacesWithinKeywords(p, errors).run(tokens)
 
     @staticmethod
     def remove_redundant_line_breaks(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.remove_redundant_line_breaks:
-            return tokens
-
-        i = 0
-        line_break_count = 0
-        while i < len(tokens):
-            token = tokens[i]
-
-            if isinstance(token, LineBreak):
-                line_break_count += 1
-            elif not isinstance(token, Whitespace):
-                line_break_count = 0
-
-            while line_break_count > 2:
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                i += TokenUtils.remove_before_if_exists(tokens, i, LineBreak)
-                line_break_count -= 1
-
-            i += 1
-
-        return tokens
+        return RemoveRedundantLineBreaks(p, errors).run(tokens)
 
     @staticmethod
     def line_break_after_semicolon(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.line_break_after_semicolon:
-            return tokens
-
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
-
-            if token.value == ';':
-                if TokenUtils.has_after(tokens, i, value=';'):
-                    errors.append('Double semicolon at {}.'.format(token.position))
-                elif not (i < len(tokens) - 2 and TokenUtils.has_after(tokens, i, Whitespace) and
-                          TokenUtils.has_after(tokens, i + 1, Comment)):
-                    TokenUtils.add_or_replace_after(tokens, i, LineBreak('\n'))
-
-            i += 1
-
-        return tokens
+        return LineBreakAfterSemicolon(p, errors).run(tokens)
 
     @staticmethod
     def space_after_comma(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.space_after_comma:
-            return tokens
-
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
-
-            if token.value == ',':
-                TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-
-            i += 1
-
-        return tokens
+        return SpaceAfterComma(p, errors).run(tokens)
 
     @staticmethod
     def replace_multiple_spaces(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.replace_multiple_spaces:
-            return tokens
-
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
-
-            if isinstance(token, Whitespace) and len(token.value) > 1:
-                token.value = ' '
-
-            i += 1
-
-        return tokens
+        return ReplaceMultipleSpaces(p, errors).run(tokens)
 
     @staticmethod
     def clear_spaces(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.clear_spaces_near_brackets:
-            return tokens
-
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
-
-            if token.value in ['(', '[']:
-                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-            elif token.value in [')', ']']:
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-            elif token.value in ['.']:
-                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-
-            i += 1
-
-        return tokens
+        return ClearSpaces(p, errors).run(tokens)
 
     @staticmethod
     def clear_line_breaks(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.clear_line_breaks_in_signatures:
-            return tokens
-
-        i = 0
-
-        after_modifier = False
-        after_return_type = False
-        after_name = False
-        parameter_brackets = 0
-
-        generic_brackets = 0
-        generic_state = False
-
-        while i < len(tokens):
-            token = tokens[i]
-
-            if generic_state and token.value == '<':
-                generic_brackets += 1
-                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-
-            elif (after_return_type or after_modifier or parameter_brackets > 0) and token.value == '<':
-                generic_brackets += 1
-                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-                if after_return_type or parameter_brackets > 0:
-                    i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                generic_state = True
-
-            elif generic_state and token.value == '>':
-                generic_brackets -= 1
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                if generic_brackets == 0:
-                    TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                    if i < len(tokens) - 1:
-                        TokenUtils.remove_after_if_exists(tokens, i + 1, LineBreak)
-                    generic_state = False
-
-            elif token.value in [';', '{', '}']:
-                if token.value == ';':
-                    TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-
-                after_modifier = False
-                after_return_type = False
-                after_name = False
-                parameter_brackets = 0
-                generic_brackets = 0
-
-            elif (after_name or after_return_type) and token.value == '(':
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                i += TokenUtils.remove_before_if_exists(tokens, i, LineBreak)
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                parameter_brackets += 1
-                after_name = False
-                after_return_type = False
-
-            elif token.value == ')':
-                parameter_brackets -= 1
-                if parameter_brackets == 0:
-                    TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-                    TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
-                    after_name = False
-                elif parameter_brackets < 0:
-                    parameter_brackets = 0
-
-            elif isinstance(token, Modifier) or token.value in ['class', 'enum', 'interface']:
-                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-                TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
-                TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                after_modifier = True
-
-            elif isinstance(token, (BasicType, Identifier)):
-                if not generic_state and after_modifier:
-                    after_modifier = False
-                    TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
-                    TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                    after_return_type = True
-                elif after_return_type and isinstance(token, Identifier):
-                    after_return_type = False
-                    after_name = True
-
-            i += 1
-
-        return tokens
+        return ClearLineBreaks(p, errors).run(tokens)
 
     @staticmethod
     def spaces_near_operators(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.spaces_near_operators:
-            return tokens
-
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
-
-            if isinstance(token, Operator):
-                if token.is_infix() or token.is_assignment():
-                    i += TokenUtils.add_or_replace_before(tokens, i, Whitespace(' '))
-                    TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                elif token.is_prefix() or token.is_postfix():
-                    i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                    TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-
-            i += 1
-
-        return tokens
+        return SpacesNearOperators(p, errors).run(tokens)
 
     @staticmethod
     def format_block_expressions(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        i = 0
-        count_braces = 0
-        started_block = False
-        switch_block = False
-        case_block = False
-
-        while i < len(tokens):
-            token = tokens[i]
-
-            if token.value in ['if', 'for', 'while', 'switch']:
-                if p.put_spaces_near_block_expression:
-                    TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                else:
-                    TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-                started_block = True
-
-                if token.value == 'switch':
-                    switch_block = True
-
-            elif token.value in ['else']:
-                TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                if p.put_spaces_near_block_expression:
-                    i += TokenUtils.add_or_replace_before(tokens, i, Whitespace(' '))
-                else:
-                    i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-
-            elif switch_block and token.value in ['case', 'default']:
-                case_block = False
-
-            elif switch_block and token.value == ':':
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                TokenUtils.add_or_replace_after(tokens, i, LineBreak('\n'))
-                case_block = True
-
-            elif started_block and token.value == '(':
-                count_braces += 1
-
-            elif started_block and token.value == ')':
-                count_braces -= 1
-                if count_braces == 0:
-                    if p.put_spaces_near_block_expression:
-                        TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-                    else:
-                        TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
-                    started_block = False
-
-            elif started_block and count_braces > 0 and token.value == ';':
-                TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
-                TokenUtils.add_or_replace_after(tokens, i, Whitespace(' '))
-
-            elif case_block and TokenUtils.is_any_line_start(token):
-                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
-                i += TokenUtils.add_or_replace_before(tokens, i, ImportantWhitespace(' ' * p.switch_case_indent))
-
-            elif switch_block and token.value == '}':
-                switch_block = False
-                case_block = False
-
-            i += 1
-
-        return tokens
+        return FormatBlockExpressions(p, errors).run(tokens)
 
     @staticmethod
     def split_long_lines(tokens: List[Token], p: Properties, errors: List) -> List[Token]:
-
-        if not p.split_long_lines:
-            return tokens
-
-        i = 0
-        split_index = None
-        current_line_length = 0
-        line_start_column = 0
-
-        brackets_split = False
-        brackets_start_column = None
-
-        while i < len(tokens):
-            token = tokens[i]
-
-            if split_index is not None and current_line_length > p.preferred_line_length:
-                if brackets_split:
-                    current_line_length = brackets_start_column
-                    i += TokenUtils.add_or_replace_before(tokens, split_index,
-                                                          Whitespace(' ' * brackets_start_column))
-                else:
-                    current_line_length = line_start_column + p.split_indent
-                    i += TokenUtils.add_or_replace_before(tokens, split_index,
-                                                          Whitespace(' ' * (line_start_column + p.split_indent)))
-
-                i += TokenUtils.add_or_replace_before(tokens, split_index, LineBreak('\n'))
-                current_line_length -= 1
-                split_index = None
-
-            if token.value in ['.', '::']:
-                split_index = i
-            elif token.value in [',']:
-                split_index = i + 1
-
-            elif not brackets_split and token.value == '(':
-                brackets_split = True
-                brackets_start_column = current_line_length
-            elif token.value == ')':
-                brackets_split = False
-
-            elif current_line_length == 0 and isinstance(token, Whitespace):
-                line_start_column = len(token.value)
-
-            elif isinstance(token, LineBreak):
-                if brackets_split:
-                    TokenUtils.add_or_replace_after(tokens, i, Whitespace(' ' * (brackets_start_column + 1)))
-                current_line_length = -len(token.value)
-                split_index = None
-
-            current_line_length += len(token.value)
-            i += 1
-
-        return tokens
+        return SplitLongLines(p, errors).run(tokens)
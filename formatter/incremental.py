@@ -0,0 +1,119 @@
+import copy
+from collections import namedtuple
+from typing import List
+
+from formatter.edits import EditCollector, apply_edits
+from formatter.pipeline import FusedPipeline
+from formatter.stages import STAGES
+from lexer.lexer import Lexer, LineIndex
+from lexer.token import LineBreak
+from util.util import Properties, FormattingResult, TextEdit
+
+# Formatting state right after the line break that ends line `line - 1`, `offset` is the start of `line`.
+Checkpoint = namedtuple('Checkpoint', ['offset', 'line', 'state'])
+
+
+def common_prefix_length(a: str, b: str, block: int = 1 << 16) -> int:
+    length = min(len(a), len(b))
+    lo = 0
+    while lo < length:
+        hi = min(length, lo + block)
+        if a[lo:hi] != b[lo:hi]:
+            # Narrow the first differing block down by halves.
+            while hi - lo > 1:
+                middle = (lo + hi) // 2
+                if a[lo:middle] == b[lo:middle]:
+                    lo = middle
+                else:
+                    hi = middle
+            return lo
+        lo = hi
+    return length
+
+
+class RangeFormatter:
+    # Formats line ranges of a document that is edited over time. The fused pipeline state is saved
+    # every CHECKPOINT_LINES lines, so a request only lexes and formats from the last checkpoint before
+    # the range (and before the first change since the previous request) to a little past its end.
+    CHECKPOINT_LINES = 200
+
+    def __init__(self, p: Properties):
+        self.p = p
+        self.source = ''
+        self.lines = LineIndex('')
+        self.checkpoints = [Checkpoint(0, 1, self._snapshot(FusedPipeline(stage(p, []) for stage in STAGES),
+                                                            EditCollector('')))]
+
+    def format_range(self, source: str, start_line: int, end_line: int, apply: bool = False) -> FormattingResult:
+        # Returns the edits of a full format that touch lines start_line..end_line (1-based, inclusive).
+        if start_line < 1 or end_line < start_line:
+            raise ValueError('Invalid line range {}-{}.'.format(start_line, end_line))
+
+        self._invalidate(source)
+
+        checkpoint = self.checkpoints[0]
+        for candidate in self.checkpoints:
+            if candidate.line > start_line:
+                break
+            checkpoint = candidate
+
+        range_start = self.lines.start(start_line)
+        range_end = self.lines.start(end_line + 1)
+
+        pipeline, collector = self._restore(checkpoint, source)
+        edits = self._format(source, checkpoint, pipeline, collector, range_end)
+        edits = [edit for edit in edits if edit.offset < range_end and
+                 (edit.offset >= range_start or edit.offset + len(edit.old) > range_start)]
+
+        code = apply_edits(source, edits) if apply else None
+        return FormattingResult(code, [error for stage in pipeline.stages for error in stage.errors], edits)
+
+    def _format(self, source: str, checkpoint: Checkpoint, pipeline: FusedPipeline, collector: EditCollector,
+                range_end: int) -> List[TextEdit]:
+        lexer = Lexer.create(source, lines=self.lines)
+        lexer.seek(checkpoint.offset, checkpoint.line)
+
+        batch = []
+        for token in collector.track(lexer.spans):
+            batch.append(token)
+
+            save = type(token) is LineBreak and \
+                lexer.current_line - self.checkpoints[-1].line >= self.CHECKPOINT_LINES
+            if not save and len(batch) < FusedPipeline.BATCH_SIZE:
+                continue
+
+            collector.add(pipeline.push(batch))
+            batch = []
+
+            if save:
+                self.checkpoints.append(Checkpoint(lexer.j, lexer.current_line, self._snapshot(pipeline, collector)))
+
+            # Edits are emitted up to the last unchanged original token, nothing after it can touch the range.
+            if collector.last_end >= range_end:
+                return collector.edits
+
+        collector.add(pipeline.push(batch))
+        collector.add(pipeline.close())
+        return collector.close()
+
+    def _invalidate(self, source: str):
+        if source is self.source:
+            return
+
+        # Checkpoints stay valid as long as everything before them is unchanged.
+        changed = common_prefix_length(self.source, source)
+        if changed < len(self.source):
+            self.checkpoints = [c for c in self.checkpoints if c.offset <= changed]
+        self.source = source
+        self.lines = LineIndex(source)
+
+    def _snapshot(self, pipeline: FusedPipeline, collector: EditCollector):
+        # Errors and edits found so far are dropped on restore, so they are not copied.
+        memo = {id(self.p): self.p, id(collector.edits): []}
+        memo.update((id(stage.errors), []) for stage in pipeline.stages)
+        return copy.deepcopy((pipeline, collector), memo)
+
+    def _restore(self, checkpoint: Checkpoint, source: str):
+        pipeline, collector = self._snapshot(*checkpoint.state)
+        collector.source = source
+        return pipeline, collector
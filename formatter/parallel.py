@@ -0,0 +1,304 @@
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterator, List, Optional
+
+from formatter.formatter import CompiledFormatter
+from formatter.pipeline import FusedPipeline
+from formatter.stages import ClearLineBreaks, STATEMENT_ENDS
+from lexer.lexer import Lexer, LineIndex
+from lexer.token import Token, LineBreak, Whitespace
+from util.util import Properties, FormattingResult
+
+# Braces, and the strings and comments that may hold braces, found without lexing.
+BRACES = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*.*?\*/|[{}]', re.S)
+
+# Part of a source starting at the beginning of `line`. `context` are the pieces (text, line, column) read
+# before it to guess the formatting state it starts in, None for the first chunk.
+Chunk = namedtuple('Chunk', ['text', 'line', 'context', 'last'])
+# `guess` is the state the chunk was formatted from, `state` and `pipeline` the ones it ended in. `clean`
+# if it was lexed up to a line break, so that the next chunk is lexed as if the source was lexed as a whole.
+ChunkResult = namedtuple('ChunkResult', ['code', 'errors', 'guess', 'state', 'pipeline', 'clean'])
+
+# Where a source is cut. The lines from `start` up to the cut are read to guess the state at the cut,
+# `openers` are the offsets of the braces open at `start`.
+Cut = namedtuple('Cut', ['offset', 'start', 'openers'])
+
+# Stand before and after a token followed on its own, see _follow.
+EDGE = Token('')
+
+# Tokens pushed last on their own, so that the state at the end of a chunk doesn't depend on how the
+# tokens before were batched.
+TAIL = 32
+
+
+def _lex(text: str, line: int, column: int = 0) -> List[Token]:
+    # `text` starts at `column` (0-based) of `line`.
+    lexer = Lexer.create(text)
+    lexer.current_line = line
+    lexer.start_of_line = -column - 1
+    return list(lexer.tokens)
+
+
+def _push(pipeline: FusedPipeline, tokens: List[Token], output: List[Token]):
+    tail = max(len(tokens) - TAIL, 0)
+    for start in range(0, tail, FusedPipeline.BATCH_SIZE):
+        output.extend(pipeline.push(tokens[start:min(start + FusedPipeline.BATCH_SIZE, tail)]))
+    output.extend(pipeline.push(tokens[tail:]))
+
+
+def _canonical(value):
+    # Tokens are compared by value and position instead of identity.
+    kind = type(value)
+    if isinstance(value, Token):
+        return kind, value.value, value.position
+    if kind is list or kind is tuple:
+        return tuple(map(_canonical, value))
+    if kind is dict:
+        return tuple((key, _canonical(item)) for key, item in value.items())
+    return value
+
+
+def _state(pipeline: FusedPipeline) -> tuple:
+    # Equal states format the tokens that follow the same way.
+    return tuple((runner.i - runner.tokens.offset, _canonical(runner.tokens.buffer),
+                  _canonical(runner.stage.state(runner.tokens.offset))) for runner in pipeline.runners)
+
+
+def _new_pipeline(p: Properties) -> FusedPipeline:
+    # Fused pipelines never take the NumPy steps, which would make the state at the end of a chunk depend on
+    # how its tokens were batched.
+    return FusedPipeline(stage(p, []) for stage in CompiledFormatter.compile(p).stages)
+
+
+def _format_chunk(pipeline: FusedPipeline, chunk: Chunk, guess=None) -> ChunkResult:
+    tokens = _lex(chunk.text, chunk.line)
+    output = []
+    _push(pipeline, tokens, output)
+    if chunk.last:
+        output.extend(pipeline.close())
+
+    state = None if chunk.last else _state(pipeline)
+    clean = chunk.last or (len(tokens) > 0 and type(tokens[-1]) is LineBreak)
+    return ChunkResult(''.join(token.value for token in output), [stage.errors for stage in pipeline.stages],
+                       guess, state, None if chunk.last else pipeline, clean)
+
+
+def _follow(p: Properties, chunk: Chunk, line: int, starts: List[dict]) -> List[tuple]:
+    # Runs in the pool. ClearLineBreaks keeps its generic_state from one declaration to the next, so its
+    # state can't be guessed from the lines before a cut. It is followed through the chunk on its own, from
+    # each of the `starts` states, to the start of `line` and to the end of the chunk. Whitespace never
+    # changes its state, so only the other tokens are stepped through, one at a time between two edges.
+    stages = []
+    for start in starts:
+        stage = ClearLineBreaks(p, [])
+        vars(stage).update(start)
+        stages.append(stage)
+    # The stages that are still apart, once two are in the same state they stay in it.
+    running = list(stages)
+
+    at_line = None
+    for token in _lex(chunk.text, chunk.line):
+        if isinstance(token, (Whitespace, LineBreak)):
+            continue
+        if at_line is None and token.position.line >= line:
+            at_line = [stage.state(0) for stage in stages]
+        for stage in running:
+            stage.step([EDGE, token, EDGE], 1)
+        if len(running) > 1 and token.code in STATEMENT_ENDS and \
+                all(stage.state(0) == running[0].state(0) for stage in running):
+            stages = [running[0]] * len(stages)
+            running = running[:1]
+
+    ends = [stage.state(0) for stage in stages]
+    return list(zip(at_line or ends, ends))
+
+
+def _guess_and_format(p: Properties, chunk: Chunk, carried: Optional[dict] = None) -> Optional[ChunkResult]:
+    # Runs in the pool. The chunk is formatted from the state the pipeline is in after its context, which
+    # is only a guess until the previous chunk's end state is known. `carried` is the state of
+    # ClearLineBreaks where the lines before the cut start. None if it failed from that state.
+    pipeline = _new_pipeline(p)
+    try:
+        if chunk.context is None:
+            return _format_chunk(pipeline, chunk)
+
+        discarded = []
+        for text, line, column in chunk.context[:-1]:
+            _push(pipeline, _lex(text, line, column), discarded)
+        if carried is not None:
+            for stage in pipeline.stages:
+                if type(stage) is ClearLineBreaks:
+                    vars(stage).update(carried)
+        for text, line, column in chunk.context[-1:]:
+            _push(pipeline, _lex(text, line, column), discarded)
+        for stage in pipeline.stages:
+            stage.errors.clear()
+
+        return _format_chunk(pipeline, chunk, _state(pipeline))
+    except Exception:
+        return None
+
+
+class ParallelFormatter:
+    # Formats a large source on several processes. The source is cut at line breaks after the closing braces of
+    # top-level types and their members, each chunk is formatted from the state a formatter would be in after
+    # the lines declaring its enclosing types and the lines before it, with the state of ClearLineBreaks
+    # followed through all earlier chunks in a first pass. A chunk is kept if the previous one really ended in
+    # that state and formatted again from the real state if it didn't, so the code and errors are the same as of
+    # a single Formatter.format. The first pass is a barrier: no chunk is formatted before it went through all
+    # of them, and it costs about as much as lexing them. Sources shorter than `threshold` characters,
+    # and every source when there is a single job, are formatted in the calling process.
+    THRESHOLD = 1 << 20
+    # Characters before a cut read to guess the state at it, enough for the windows of all stages.
+    CONTEXT_SIZE = 4096
+    # Chunks per process, so that uneven chunks still keep every process busy.
+    CHUNKS_PER_JOB = 2
+
+    def __init__(self, p: Properties, executor: Optional[Executor] = None, jobs: Optional[int] = None,
+                 threshold: int = THRESHOLD):
+        self.p = p
+        self.jobs = jobs or os.cpu_count() or 1
+        self.threshold = threshold
+        self.own_executor = executor is None
+        # Started on the first source that is split.
+        self.executor = executor
+
+    def format(self, source: str) -> FormattingResult:
+        chunks = self.split(source)
+        if len(chunks) == 1:
+            return CompiledFormatter.compile(self.p).format(source)
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.jobs)
+        results = list(self.executor.map(_guess_and_format, repeat(self.p), chunks, self.carried(chunks)))
+
+        code = []
+        errors = [[] for _ in CompiledFormatter.compile(self.p).stages]
+        previous = None
+        for chunk, result in zip(chunks, results):
+            if result is None or (previous is not None and result.guess != previous.state):
+                # Formatted from a wrong guess, again from the state the previous chunk really ended in.
+                pipeline = previous.pipeline if previous is not None else _new_pipeline(self.p)
+                for stage in pipeline.stages:
+                    stage.errors.clear()
+                result = _format_chunk(pipeline, chunk)
+
+            if not result.clean:
+                # Cut inside a comment, the lexer would have read on past the cut.
+                return CompiledFormatter.compile(self.p).format(source)
+
+            code.append(result.code)
+            for stage_errors, chunk_errors in zip(errors, result.errors):
+                stage_errors.extend(chunk_errors)
+            previous = result
+
+        return FormattingResult(''.join(code), [error for stage_errors in errors for error in stage_errors])
+
+    def carried(self, chunks: List[Chunk]) -> list:
+        # The state of ClearLineBreaks where the context of each chunk starts. A chunk starts after a
+        # closing brace, which resets all of it but generic_state, so it is followed through every chunk
+        # from both values of generic_state and the states are chained from the first chunk on.
+        if ClearLineBreaks not in CompiledFormatter.compile(self.p).stages:
+            return [None] * len(chunks)
+
+        fresh = ClearLineBreaks(self.p, []).state(0)
+        starts = [[fresh]] + [[dict(fresh, generic_state=False), dict(fresh, generic_state=True)]] * (len(chunks) - 2)
+        lines = [chunk.context[-1][1] if chunk.context else chunk.line for chunk in chunks[1:]]
+
+        carried = [None]
+        generic_state = False
+        for states in self.executor.map(_follow, repeat(self.p), chunks[:-1], lines, starts):
+            at_line, end = states[generic_state]
+            carried.append(at_line)
+            generic_state = end['generic_state']
+        return carried
+
+    def split(self, source: str) -> List[Chunk]:
+        # With a single job the first pass and the pickling of chunks would only add to a serial format.
+        if self.jobs == 1 or len(source) < self.threshold:
+            return [Chunk(source, 1, None, True)]
+
+        size = max(len(source) // (self.jobs * self.CHUNKS_PER_JOB), self.threshold // 4)
+        lines = LineIndex(source)
+
+        chunks = []
+        start, start_cut = 0, None
+        for cut in self.cuts(source, size):
+            chunks.append(self.chunk(source, lines, start, cut.offset, start_cut))
+            start, start_cut = cut.offset, cut
+
+        chunks.append(self.chunk(source, lines, start, len(source), start_cut))
+        return chunks
+
+    def chunk(self, source: str, lines: LineIndex, start: int, end: int, cut: Optional[Cut]) -> Chunk:
+        context = self.context(source, lines, cut) if cut is not None else None
+        return Chunk(source[start:end], lines.line(start), context, end == len(source))
+
+    def context(self, source: str, lines: LineIndex, cut: Cut) -> list:
+        # The headers of the braces open where the lines before the cut start, then those lines. A header
+        # starts after the last brace closed before it on its line, like the `else {` of `} else {`.
+        pieces = []
+        previous = None
+        for opener in cut.openers:
+            line = lines.line(opener)
+            if line == previous:
+                continue
+            previous = line
+            line_start = lines.start(line)
+            start = source.rfind('}', line_start, opener) + 1 or line_start
+            pieces.append((source[start:lines.end(line)], line, start - line_start))
+
+        pieces.append((source[cut.start:cut.offset], lines.line(cut.start), 0))
+        return pieces
+
+    def cuts(self, source: str, size: int) -> Iterator[Cut]:
+        # Line starts after a brace closing a top-level type or one of its members, at least `size`
+        # characters apart.
+        openers = []
+        # Every brace closed so far with the brace it closed, and the spans of block comments, in order.
+        closing, closed = [], []
+        comment_starts, comment_ends = [], []
+        target = size
+        previous = 0
+        for match in BRACES.finditer(source):
+            value = match.group()
+            if value == '{':
+                openers.append(match.start())
+            elif value == '}':
+                if openers:
+                    closing.append(match.start())
+                    closed.append(openers.pop())
+                if len(openers) <= 1 and match.start() >= target:
+                    end = source.find('\n', match.end()) + 1
+                    if 0 < end < len(source) - size // 2:
+                        # The lines read before the cut start in its chunk, outside of any block comment.
+                        start = max(source.rfind('\n', 0, max(end - self.CONTEXT_SIZE, 0)) + 1, previous)
+                        k = bisect_right(comment_starts, start) - 1
+                        if k >= 0 and comment_ends[k] > start:
+                            start = source.rfind('\n', 0, comment_starts[k]) + 1
+
+                        # Braces open at the start: those still open at the cut, and those closed in between.
+                        first = bisect_left(closing, start)
+                        start_openers = [opener for opener in openers if opener < start] + \
+                                        [opener for opener in closed[first:] if opener < start]
+                        yield Cut(end, start, sorted(start_openers))
+                        target = end + size
+                        previous = end
+            elif value.startswith('/*'):
+                comment_starts.append(match.start())
+                comment_ends.append(match.end())
+
+    def close(self):
+        if self.own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self) -> 'ParallelFormatter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,158 @@
+import time
+from itertools import chain, islice
+from typing import Iterable, List
+
+from formatter.profile import StageStats, CountingTokens
+from formatter.stages import Stage
+
+
+class TokenWindow:
+    # List-like view over a stream of tokens, indexed by absolute position.
+    # Tokens before `offset` have already been handed to the next stage.
+
+    def __init__(self):
+        self.offset = 0
+        self.buffer = []
+
+    def __len__(self):
+        return self.offset + len(self.buffer)
+
+    def __getitem__(self, i):
+        return self.buffer[i - self.offset]
+
+    def __setitem__(self, i, token):
+        self.buffer[i - self.offset] = token
+
+    def insert(self, i, token):
+        self.buffer.insert(i - self.offset, token)
+
+    def pop(self, i):
+        return self.buffer.pop(i - self.offset)
+
+    def slice(self, start, end):
+        return self.buffer[start - self.offset:end - self.offset]
+
+    def replace(self, start, end, tokens):
+        self.buffer[start - self.offset:end - self.offset] = tokens
+
+    def extend(self, tokens):
+        self.buffer.extend(tokens)
+
+    def flush(self, limit):
+        count = limit - self.offset
+        if count <= 0:
+            return []
+
+        flushed = self.buffer[:count]
+        del self.buffer[:count]
+        self.offset = limit
+        return flushed
+
+
+class StageRunner:
+    # Stages never look further than this many tokens behind or ahead of the current one.
+    LOOKBEHIND = 4
+    LOOKAHEAD = 4
+
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self.tokens = TokenWindow()
+        self.i = 0
+
+    def push(self, tokens: List) -> List:
+        self.tokens.extend(tokens)
+
+        stage = self.stage
+        window = self.tokens
+        # Stages change the buffer in place, the window offset only moves on flush.
+        buffer = window.buffer
+        end = window.offset - self.LOOKAHEAD
+        i = self.i
+        while i < end + len(buffer):
+            i = stage.step(window, i)
+        self.i = i
+
+        limit = i - self.LOOKBEHIND
+        retain = stage.retain
+        if retain is not None:
+            limit = min(limit, retain - self.LOOKBEHIND)
+
+        return window.flush(limit)
+
+    def close(self) -> List:
+        stage = self.stage
+        window = self.tokens
+        i = self.i
+        while i < len(window):
+            i = stage.step(window, i)
+        self.i = i
+
+        stage.finish(window)
+        return window.flush(len(window))
+
+
+class CountingTokenWindow(CountingTokens, TokenWindow):
+    pass
+
+
+class ProfiledStageRunner(StageRunner):
+
+    def __init__(self, stage: Stage, stats: StageStats):
+        super().__init__(stage)
+        self.stats = stats
+        self.tokens = CountingTokenWindow()
+        self.tokens.stats = stats
+
+    def push(self, tokens: List) -> List:
+        start = time.perf_counter()
+        flushed = super().push(tokens)
+        self.stats.seconds += time.perf_counter() - start
+        self.stats.tokens_in += len(tokens)
+        self.stats.tokens_out += len(flushed)
+        return flushed
+
+    def close(self) -> List:
+        start = time.perf_counter()
+        flushed = super().close()
+        self.stats.seconds += time.perf_counter() - start
+        self.stats.tokens_out += len(flushed)
+        return flushed
+
+
+class FusedPipeline:
+    BATCH_SIZE = 512
+
+    def __init__(self, stages: Iterable[Stage], profile: bool = False):
+        self.stages = [stage for stage in stages if stage.enabled]
+
+        # Per-stage stats, None unless profiling.
+        self.stats = None
+        if profile:
+            self.stats = [StageStats(type(stage).__name__) for stage in self.stages]
+            self.runners = [ProfiledStageRunner(stage, stats) for stage, stats in zip(self.stages, self.stats)]
+        else:
+            self.runners = [StageRunner(stage) for stage in self.stages]
+
+    def push(self, tokens: List) -> List:
+        for runner in self.runners:
+            tokens = runner.push(tokens)
+        return tokens
+
+    def close(self) -> List:
+        tokens = []
+        for runner in self.runners:
+            tokens = runner.push(tokens) + runner.close()
+        return tokens
+
+    def batches(self, tokens: Iterable):
+        tokens = iter(tokens)
+        while True:
+            batch = list(islice(tokens, self.BATCH_SIZE))
+            if not batch:
+                break
+            yield self.push(batch)
+
+        yield self.close()
+
+    def run(self, tokens: Iterable):
+        return chain.from_iterable(self.batches(tokens))
@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
+
+from formatter.sequence import TokenSequence
+from util.util import Representable
+
+# Called with the StageStats of every stage once a file is formatted.
+Observer = Callable[['StageStats'], None]
+
+
+class StageStats(Representable):
+    FIELDS = ('seconds', 'tokens_in', 'tokens_out', 'inserts', 'removes', 'replaces')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.inserts = 0
+        self.removes = 0
+        self.replaces = 0
+
+    def add(self, other: 'StageStats'):
+        for field in StageStats.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class CountingTokens:
+    # Counts the changes stages make through TokenUtils. Only used while profiling, so the plain
+    # containers keep their speed otherwise.
+    stats = None
+
+    def __setitem__(self, i, token):
+        self.stats.replaces += 1
+        super().__setitem__(i, token)
+
+    def insert(self, i, token):
+        self.stats.inserts += 1
+        super().insert(i, token)
+
+    def pop(self, i=-1):
+        self.stats.removes += 1
+        return super().pop(i)
+
+    def replace(self, start, end, tokens):
+        # Only the difference in length is known without comparing the tokens.
+        tokens = list(tokens)
+        difference = len(tokens) - (end - start)
+        if difference > 0:
+            self.stats.inserts += difference
+        else:
+            self.stats.removes -= difference
+        super().replace(start, end, tokens)
+
+
+class CountingTokenSequence(CountingTokens, TokenSequence):
+    pass
+
+
+def profile_tokens(tokens: Iterable, stats: StageStats) -> Iterable:
+    # Attributes the time spent producing tokens, e.g. by a lazy lexer, to `stats`.
+    tokens = iter(tokens)
+    while True:
+        start = time.perf_counter()
+        try:
+            token = next(tokens)
+        except StopIteration:
+            stats.seconds += time.perf_counter() - start
+            return
+        stats.seconds += time.perf_counter() - start
+        stats.tokens_out += 1
+        yield token
+
+
+class Profiler:
+    # Observer that sums up the stats of every formatted file, stage by stage.
+
+    def __init__(self):
+        self.stages = OrderedDict()
+
+    def __call__(self, stats: StageStats):
+        total = self.stages.get(stats.name)
+        if total is None:
+            total = self.stages[stats.name] = StageStats(stats.name)
+        total.add(stats)
+
+    def merge(self, stats: Optional[Iterable[StageStats]]):
+        for s in stats or ():
+            self(s)
+
+    def as_list(self) -> List[dict]:
+        return [stats.as_dict() for stats in self.stages.values()]
+
+    def table(self) -> str:
+        total = sum(stats.seconds for stats in self.stages.values()) or 1
+        lines = ['{:<28} {:>10} {:>6} {:>10} {:>10} {:>9} {:>9} {:>9}'.format(
+            'stage', 'seconds', '%', 'in', 'out', 'inserts', 'removes', 'replaces')]
+        for stats in self.stages.values():
+            lines.append('{:<28} {:>10.4f} {:>6.1f} {:>10} {:>10} {:>9} {:>9} {:>9}'.format(
+                stats.name, stats.seconds, stats.seconds / total * 100, stats.tokens_in, stats.tokens_out,
+                stats.inserts, stats.removes, stats.replaces))
+        return '\n'.join(lines)
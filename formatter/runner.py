@@ -0,0 +1,148 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+from formatter.cache import ResultCache, TokenCache
+from formatter.formatter import Formatter
+from formatter.parallel import ParallelFormatter
+from formatter.profile import Profiler
+from util.util import SourceFile, Properties, FileResult, Helpers, WriteBatch
+
+# Properties and cache of the current worker process, set up once by the pool initializer.
+_worker = {}
+
+
+def _init_worker(properties_path: str, fused: bool, cache_dir: Optional[str], cache_size: int, stream: bool,
+                 profile: bool, check: bool, fsync: bool):
+    _worker['properties'] = Properties(properties_path)
+    _worker['fused'] = fused
+    # Cached results would leave nothing to profile.
+    _worker['cache'] = ResultCache(cache_dir, cache_size) if cache_dir is not None and not profile else None
+    # Lexer output, reused when only the properties changed since a file was cached.
+    _worker['tokens'] = TokenCache(cache_dir, cache_size) if cache_dir is not None and not profile else None
+    _worker['stream'] = stream
+    _worker['profile'] = profile
+    _worker['check'] = check
+    _worker['fsync'] = fsync
+    # Set for a single file formatted on all processes.
+    _worker['parallel'] = None
+
+
+def _format_file_streaming(path: str, profiler: Optional[Profiler], batch: WriteBatch) -> FileResult:
+    file = SourceFile(path)
+    temp_path = None
+    try:
+        with file.reader() as reader:
+            temp_path, writer = file.open_temporary()
+            with writer:
+                result = Formatter.format_stream(reader, writer, _worker['properties'], observer=profiler,
+                                                 encoding=file.encoding)
+
+        # Streamed output has '\n' line breaks, compared as text like the formatted code of a whole file.
+        changed = not file.same_text(temp_path)
+        if changed:
+            batch.commit(temp_path, path)
+            temp_path = None
+
+        return FileResult(path, changed, result.errors, None, Runner.stats(profiler))
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+
+
+def _format_file(path: str, batch: WriteBatch) -> FileResult:
+    profiler = Profiler() if _worker['profile'] else None
+    try:
+        if _worker['check']:
+            difference = Formatter.check(SourceFile(path).read_all(), _worker['properties'])
+            return FileResult(path, difference is not None, [], None, None, difference)
+
+        if _worker['stream']:
+            return _format_file_streaming(path, profiler, batch)
+
+        file = SourceFile(path)
+        source = file.read_all()
+        p = _worker['properties']
+        cache = _worker['cache']
+
+        result = cache.get(source, p) if cache is not None else None
+        if result is None:
+            if _worker['parallel'] is not None:
+                result = _worker['parallel'].format(source)
+            elif _worker['tokens'] is not None:
+                result = Formatter.format_tokens(_worker['tokens'].tokens(source), p, fused=_worker['fused'])
+            else:
+                result = Formatter.format(source, p, fused=_worker['fused'], observer=profiler)
+            if cache is not None:
+                cache.put(source, p, result)
+
+        changed = result.code != source
+        if changed:
+            batch.write(file, result.code)
+
+        return FileResult(path, changed, result.errors, None, Runner.stats(profiler))
+    except Exception as e:
+        return FileResult(path, False, [], '{}: {}'.format(type(e).__name__, e))
+
+
+def _format_files(paths: List[str]) -> List[FileResult]:
+    # Files of a chunk are written as one batch.
+    with WriteBatch(_worker['fsync']) as batch:
+        return [_format_file(path, batch) for path in paths]
+
+
+class Runner:
+    MAX_CHUNK_SIZE = 16
+
+    def __init__(self, properties_path: str, jobs: int = 1, fused: bool = True, cache_dir: Optional[str] = None,
+                 cache_size: int = 64 * 1024 * 1024, stream: bool = False, profile: bool = False, check: bool = False,
+                 fsync: bool = False):
+        self.properties_path = properties_path
+        self.jobs = jobs
+        self.fused = fused
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.stream = stream
+        self.profile = profile
+        # Only find the files formatting would change, nothing is written.
+        self.check = check
+        # Sync written files to disk, a chunk of files at a time.
+        self.fsync = fsync
+
+    def run(self, paths: List[str]) -> Iterator[FileResult]:
+        initargs = (self.properties_path, self.fused, self.cache_dir, self.cache_size, self.stream, self.profile,
+                    self.check, self.fsync)
+
+        if self.jobs <= 1 or len(paths) <= 1:
+            _init_worker(*initargs)
+            if self.jobs > 1 and self.fused and not (self.stream or self.profile or self.check):
+                # A single large file is cut up and formatted on all processes instead.
+                _worker['parallel'] = ParallelFormatter(_worker['properties'], jobs=self.jobs)
+            try:
+                for results in map(_format_files, Runner.chunks(paths, self.MAX_CHUNK_SIZE)):
+                    yield from results
+            finally:
+                if _worker['parallel'] is not None:
+                    _worker['parallel'].close()
+                    _worker['parallel'] = None
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker, initargs=initargs) as executor:
+                chunk_size = max(1, min(self.MAX_CHUNK_SIZE, len(paths) // (self.jobs * 4)))
+                for results in executor.map(_format_files, Runner.chunks(paths, chunk_size)):
+                    yield from results
+
+        if self.cache_dir is not None:
+            ResultCache(self.cache_dir, self.cache_size).evict()
+
+    @staticmethod
+    def chunks(paths: List[str], size: int) -> Iterator[List[str]]:
+        for i in range(0, len(paths), size):
+            yield paths[i:i + size]
+
+    @staticmethod
+    def stats(profiler: Optional[Profiler]):
+        return list(profiler.stages.values()) if profiler is not None else None
+
+    @staticmethod
+    def summary(results: List[FileResult]) -> str:
+        return Helpers.summary(results)
@@ -0,0 +1,111 @@
+from itertools import chain, islice
+
+
+class TokenSequence:
+    # Gap buffer: free slots are kept at the last edited position, so inserts and pops near the
+    # previous edit only move the tokens between the two positions instead of the whole tail.
+    MIN_GAP = 64
+
+    def __init__(self, tokens=()):
+        self.items = list(tokens)
+        self.gap_start = len(self.items)
+        self.gap_end = len(self.items)
+
+    def __len__(self):
+        return len(self.items) - (self.gap_end - self.gap_start)
+
+    def __iter__(self):
+        return chain(islice(self.items, 0, self.gap_start), islice(self.items, self.gap_end, None))
+
+    def __getitem__(self, i):
+        return self.items[self._index(i)]
+
+    def __setitem__(self, i, token):
+        self.items[self._index(i)] = token
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (TokenSequence, list)):
+            return list(self) == list(other)
+        return False
+
+    def __repr__(self) -> str:
+        return '{}({})'.format(type(self).__name__, list(self))
+
+    def insert(self, i, token):
+        length = len(self)
+        if i < 0:
+            i = max(0, i + length)
+        i = min(i, length)
+
+        self._move_gap(i)
+        if self.gap_start == self.gap_end:
+            self._grow()
+
+        self.items[self.gap_start] = token
+        self.gap_start += 1
+
+    def append(self, token):
+        self.insert(len(self), token)
+
+    def pop(self, i=-1):
+        length = len(self)
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError('pop index out of range')
+
+        self._move_gap(i + 1)
+        self.gap_start -= 1
+        token = self.items[self.gap_start]
+        self.items[self.gap_start] = None
+        return token
+
+    def slice(self, start, end):
+        if end <= self.gap_start:
+            return self.items[start:end]
+        if start >= self.gap_start:
+            return self.items[start + self.gap_end - self.gap_start:end + self.gap_end - self.gap_start]
+        return self.items[start:self.gap_start] + self.items[self.gap_end:end + self.gap_end - self.gap_start]
+
+    def replace(self, start, end, tokens):
+        # Replaces tokens[start:end] at once, the gap ends up after the new tokens.
+        tokens = list(tokens)
+        self._move_gap(end)
+        self.items[start:self.gap_start] = [None] * (self.gap_start - start)
+        self.gap_start = start
+
+        while self.gap_end - self.gap_start < len(tokens):
+            self._grow()
+        self.items[start:start + len(tokens)] = tokens
+        self.gap_start += len(tokens)
+
+    def _index(self, i):
+        length = len(self)
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError('token index out of range')
+
+        if i < self.gap_start:
+            return i
+        return i + self.gap_end - self.gap_start
+
+    def _move_gap(self, i):
+        items = self.items
+
+        if i < self.gap_start:
+            count = self.gap_start - i
+            items[self.gap_end - count:self.gap_end] = items[i:self.gap_start]
+            self.gap_start -= count
+            self.gap_end -= count
+
+        elif i > self.gap_start:
+            count = i - self.gap_start
+            items[self.gap_start:i] = items[self.gap_end:self.gap_end + count]
+            self.gap_start += count
+            self.gap_end += count
+
+    def _grow(self):
+        size = max(self.MIN_GAP, len(self) // 4)
+        self.items[self.gap_end:self.gap_end] = [None] * size
+        self.gap_end += size
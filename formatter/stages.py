@@ -0,0 +1,595 @@
+from typing import List, Optional
+
+from formatter import vectorized
+from formatter.util import TokenUtils, SPACE, LINE_BREAK
+from lexer.token import *
+from util.util import Properties
+
+# Codes of the values stages look for, see lexer.token.CODES.
+NEWLINE, LPAREN, RPAREN, LBRACKET, RBRACKET, LBRACE, RBRACE, SEMICOLON, COMMA, DOT, COLON, DOUBLE_COLON, LESS, \
+    GREATER, SWITCH, ELSE = (CODES[value] for value in ('\n', '(', ')', '[', ']', '{', '}', ';', ',', '.', ':', '::',
+                                                        '<', '>', 'switch', 'else'))
+
+OPENING_BRACKETS = frozenset((LPAREN, LBRACKET))
+CLOSING_BRACKETS = frozenset((RPAREN, RBRACKET))
+MEMBER_ACCESS = frozenset((DOT, DOUBLE_COLON))
+STATEMENT_ENDS = frozenset((SEMICOLON, LBRACE, RBRACE))
+TYPE_DECLARATIONS = frozenset(CODES[value] for value in ('class', 'enum', 'interface'))
+BLOCK_STATEMENTS = frozenset(CODES[value] for value in ('if', 'for', 'while', 'switch'))
+SWITCH_LABELS = frozenset(CODES[value] for value in ('case', 'default'))
+CONTINUATIONS = frozenset(CODES[value] for value in ('else', 'catch', 'finally'))
+BRACKETS = frozenset((LPAREN, RPAREN, LBRACE, RBRACE))
+UNSPLIT_LINES = frozenset(CODES[value] for value in ('import', 'package'))
+
+
+class Stage:
+    # Name of the boolean property that switches the stage on, None if the stage always runs.
+    option = None
+
+    def __init__(self, p: Properties, errors: List):
+        self.p = p
+        self.errors = errors
+
+    @property
+    def enabled(self) -> bool:
+        return self.option is None or bool(getattr(self.p, self.option))
+
+    @property
+    def retain(self):
+        # Lowest token index the stage may still modify, None if it only looks at its own window.
+        return None
+
+    def step(self, tokens, i: int) -> int:
+        raise NotImplementedError
+
+    def finish(self, tokens):
+        pass
+
+    def state(self, offset: int) -> dict:
+        # Everything that decides how the stage goes on, token indices made relative to `offset`.
+        return {name: value for name, value in vars(self).items() if name not in ('p', 'errors')}
+
+    def run(self, tokens):
+        if not self.enabled:
+            return tokens
+
+        i = 0
+        while i < len(tokens):
+            i = self.step(tokens, i)
+
+        self.finish(tokens)
+        return tokens
+
+
+class VectorizedStage(Stage):
+    # Stage with a NumPy step for the rest of a window, see formatter.vectorized. It only pays off on a whole list
+    # of tokens, so it is used by run() and not for the short windows of a fused pipeline.
+
+    def __init__(self, p: Properties, errors: List):
+        super().__init__(p, errors)
+        self.vectorized = False
+
+    def run(self, tokens):
+        self.vectorized = vectorized.ENABLED
+        return super().run(tokens)
+
+
+class ClearSpaces(Stage):
+    option = 'clear_spaces_near_brackets'
+
+    def step(self, tokens, i):
+        code = tokens[i].code
+
+        if code in OPENING_BRACKETS:
+            TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+        elif code in CLOSING_BRACKETS:
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+        elif code == DOT:
+            TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+
+        return i + 1
+
+
+class ReplaceMultipleSpaces(VectorizedStage):
+    option = 'replace_multiple_spaces'
+
+    def step(self, tokens, i):
+        end = len(tokens)
+        if self.vectorized and end - i >= vectorized.MIN_WINDOW:
+            # Each token on its own, the rest of the window at once.
+            for j in vectorized.long_whitespace(TokenUtils.slice(tokens, i, end)):
+                tokens[i + j] = SPACE
+            return end
+
+        token = tokens[i]
+
+        if isinstance(token, Whitespace) and len(token.value) > 1:
+            tokens[i] = SPACE
+
+        return i + 1
+
+
+class SpacesNearOperators(Stage):
+    option = 'spaces_near_operators'
+
+    def step(self, tokens, i):
+        token = tokens[i]
+
+        if isinstance(token, Operator):
+            flags = FLAGS[token.code]
+            if flags & (INFIX | ASSIGNMENT):
+                i += TokenUtils.add_or_replace_before(tokens, i, SPACE)
+                TokenUtils.add_or_replace_after(tokens, i, SPACE)
+            elif flags & (PREFIX | POSTFIX):
+                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+
+        return i + 1
+
+
+class SpaceAfterComma(Stage):
+    option = 'space_after_comma'
+
+    def step(self, tokens, i):
+        if tokens[i].code == COMMA:
+            TokenUtils.add_or_replace_after(tokens, i, SPACE)
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+
+        return i + 1
+
+
+class SpacesWithinKeywords(Stage):
+    option = 'spaces_within_keywords'
+
+    def step(self, tokens, i):
+        token = tokens[i]
+
+        if isinstance(token, Keyword):
+            i += TokenUtils.add_or_replace_before(tokens, i, SPACE)
+
+        return i + 1
+
+
+class ClearLineBreaks(Stage):
+    option = 'clear_line_breaks_in_signatures'
+
+    def __init__(self, p: Properties, errors: List):
+        super().__init__(p, errors)
+        self.after_modifier = False
+        self.after_return_type = False
+        self.after_name = False
+        self.parameter_brackets = 0
+
+        self.generic_brackets = 0
+        self.generic_state = False
+
+    def step(self, tokens, i):
+        token = tokens[i]
+        code = token.code
+
+        if self.generic_state and code == LESS:
+            self.generic_brackets += 1
+            TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+
+        elif (self.after_return_type or self.after_modifier or self.parameter_brackets > 0) and code == LESS:
+            self.generic_brackets += 1
+            TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+            if self.after_return_type or self.parameter_brackets > 0:
+                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+            self.generic_state = True
+
+        elif self.generic_state and code == GREATER:
+            self.generic_brackets -= 1
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+            if self.generic_brackets == 0:
+                TokenUtils.add_or_replace_after(tokens, i, SPACE)
+                if i < len(tokens) - 1:
+                    TokenUtils.remove_after_if_exists(tokens, i + 1, LineBreak)
+                self.generic_state = False
+
+        elif code in STATEMENT_ENDS:
+            if code == SEMICOLON:
+                TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+
+            self.after_modifier = False
+            self.after_return_type = False
+            self.after_name = False
+            self.parameter_brackets = 0
+            self.generic_brackets = 0
+
+        elif (self.after_name or self.after_return_type) and code == LPAREN:
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+            i += TokenUtils.remove_before_if_exists(tokens, i, LineBreak)
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+            self.parameter_brackets += 1
+            self.after_name = False
+            self.after_return_type = False
+
+        elif code == RPAREN:
+            self.parameter_brackets -= 1
+            if self.parameter_brackets == 0:
+                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+                TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
+                self.after_name = False
+            elif self.parameter_brackets < 0:
+                self.parameter_brackets = 0
+
+        elif isinstance(token, Modifier) or code in TYPE_DECLARATIONS:
+            TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+            TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
+            TokenUtils.add_or_replace_after(tokens, i, SPACE)
+            self.after_modifier = True
+
+        elif isinstance(token, (BasicType, Identifier)):
+            if not self.generic_state and self.after_modifier:
+                self.after_modifier = False
+                TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
+                TokenUtils.add_or_replace_after(tokens, i, SPACE)
+                self.after_return_type = True
+            elif self.after_return_type and isinstance(token, Identifier):
+                self.after_return_type = False
+                self.after_name = True
+
+        return i + 1
+
+
+class LineBreakAfterSemicolon(Stage):
+    option = 'line_break_after_semicolon'
+
+    def step(self, tokens, i):
+        token = tokens[i]
+
+        if token.code == SEMICOLON:
+            if TokenUtils.has_after(tokens, i, value=';'):
+                self.errors.append('Double semicolon at {}.'.format(token.position))
+            elif not (i < len(tokens) - 2 and TokenUtils.has_after(tokens, i, Whitespace) and
+                      TokenUtils.has_after(tokens, i + 1, Comment)):
+                TokenUtils.add_or_replace_after(tokens, i, LINE_BREAK)
+
+        return i + 1
+
+
+class FormatBlockExpressions(Stage):
+
+    def __init__(self, p: Properties, errors: List):
+        super().__init__(p, errors)
+        self.count_braces = 0
+        self.started_block = False
+        self.switch_block = False
+        self.case_block = False
+        self.case_indent = ImportantWhitespace(' ' * p.switch_case_indent)
+
+    def step(self, tokens, i):
+        token = tokens[i]
+        code = token.code
+        p = self.p
+
+        if code in BLOCK_STATEMENTS:
+            if p.put_spaces_near_block_expression:
+                TokenUtils.add_or_replace_after(tokens, i, SPACE)
+            else:
+                TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+            self.started_block = True
+
+            if code == SWITCH:
+                self.switch_block = True
+
+        elif code == ELSE:
+            TokenUtils.add_or_replace_after(tokens, i, SPACE)
+            if p.put_spaces_near_block_expression:
+                i += TokenUtils.add_or_replace_before(tokens, i, SPACE)
+            else:
+                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+
+        elif self.switch_block and code in SWITCH_LABELS:
+            self.case_block = False
+
+        elif self.switch_block and code == COLON:
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+            TokenUtils.add_or_replace_after(tokens, i, LINE_BREAK)
+            self.case_block = True
+
+        elif self.started_block and code == LPAREN:
+            self.count_braces += 1
+
+        elif self.started_block and code == RPAREN:
+            self.count_braces -= 1
+            if self.count_braces == 0:
+                if p.put_spaces_near_block_expression:
+                    TokenUtils.add_or_replace_after(tokens, i, SPACE)
+                else:
+                    TokenUtils.remove_after_if_exists(tokens, i, Whitespace)
+                self.started_block = False
+
+        elif self.started_block and self.count_braces > 0 and code == SEMICOLON:
+            TokenUtils.remove_after_if_exists(tokens, i, LineBreak)
+            TokenUtils.add_or_replace_after(tokens, i, SPACE)
+
+        elif self.case_block and TokenUtils.is_any_line_start(token):
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+            i += TokenUtils.add_or_replace_before(tokens, i, self.case_indent)
+
+        elif self.switch_block and code == RBRACE:
+            self.switch_block = False
+            self.case_block = False
+
+        return i + 1
+
+
+class CurlyBracesFormatter(Stage):
+    option = 'format_curly_braces'
+
+    def __init__(self, p: Properties, errors: List):
+        super().__init__(p, errors)
+        self.indent = 0
+        self.skip_to_line_break = False
+
+    def step(self, tokens, i):
+        token = tokens[i]
+        code = token.code
+        p = self.p
+
+        if code == LBRACE:
+            if (i > 2 and TokenUtils.has_before(tokens, i, Whitespace) and TokenUtils.has_before(tokens, i - 1,
+                                                                                                 LineBreak)) or \
+                    (i > 1 and TokenUtils.has_before(tokens, i, LineBreak)) or \
+                    i == 0:
+                i += TokenUtils.add_or_replace_before(tokens, i, TokenUtils.whitespace(self.indent))
+            else:
+                i += TokenUtils.add_or_replace_before(tokens, i, SPACE)
+
+            self.indent += p.indent
+            TokenUtils.add_or_replace_after(tokens, i, LINE_BREAK)
+
+        elif code == RBRACE:
+            self.indent = self.indent - p.indent
+            if self.indent < 0:
+                self.errors.append('Unexpected closing bracket at {}, set indent to 0.'.format(token.position))
+                self.indent = 0
+
+            i += TokenUtils.add_or_replace_before(tokens, i, LINE_BREAK, TokenUtils.whitespace(self.indent))
+
+        elif self.skip_to_line_break:
+            if code == NEWLINE:
+                self.skip_to_line_break = False
+
+        elif TokenUtils.is_any_line_start(token) or (isinstance(token, Comment) and token.value.startswith('//')):
+            self.skip_to_line_break = True
+            if code in CONTINUATIONS:
+                i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+                i += TokenUtils.remove_before_if_exists(tokens, i, LineBreak)
+                i += TokenUtils.add_or_replace_before(tokens, i, SPACE)
+            else:
+                i += TokenUtils.add_or_replace_before(tokens, i, TokenUtils.whitespace(self.indent))
+
+        elif code in MEMBER_ACCESS:
+            self.skip_to_line_break = True
+            i += TokenUtils.add_or_replace_before(tokens, i, TokenUtils.whitespace(self.indent + p.split_indent))
+
+        elif not p.preserve_comment_indent and isinstance(token, Comment) and token.value.startswith('/*'):
+            tokens[i] = TokenUtils.format_comment(token, self.indent)
+            i += TokenUtils.add_or_replace_before(tokens, i, TokenUtils.whitespace(self.indent))
+
+            if p.line_break_after_comment:
+                TokenUtils.add_or_replace_after(tokens, i, LINE_BREAK)
+
+        return i + 1
+
+    def finish(self, tokens):
+        if self.indent > 0:
+            self.errors.append('Expected closing bracket at the end.')
+
+
+class SplitLongLines(Stage):
+    # Fits every line into preferred_line_length as the line streams by: it may be split before a member
+    # access or after a comma, and is split greedily at the last such point that still fits. Each token
+    # is measured once, widths between split points come from running totals, and a line is rewritten
+    # in a single replace once its line break arrives. A continuation line is aligned after the innermost
+    # open parenthesis, or indented by split_indent when that is too deep or there is none.
+    option = 'split_long_lines'
+
+    def __init__(self, p: Properties, errors: List):
+        super().__init__(p, errors)
+        self.limit = p.preferred_line_length
+        self.split_indent = p.split_indent
+
+        # Open parentheses and braces, possibly from previous lines: [code, column after it, index].
+        self.brackets = []
+        self.new_line(0)
+
+    def new_line(self, start: int):
+        self.line_start = start
+        self.indent = None
+        self.splits = []
+        self.skip = False
+
+        # Widths are measured as if the line was never split, `shift` turns them into columns of the
+        # part of the line after the last split.
+        self.width = 0
+        self.visible_width = 0
+        self.shift = 0
+        self.part_empty = True
+
+        # Last point the line can be split at: (index, indent, width before it).
+        self.candidate = None
+        self.after_comma = False
+
+    @property
+    def retain(self):
+        return self.line_start
+
+    def step(self, tokens, i):
+        token = tokens[i]
+        code = token.code
+
+        if code == NEWLINE:
+            if self.splits:
+                i = self.split(tokens, self.line_start, i)
+            self.new_line(i + 1)
+            return i + 1
+
+        whitespace = type(token) is Whitespace
+        if self.indent is None:
+            if whitespace:
+                self.indent = self.width = len(token.value)
+                return i + 1
+            self.indent = 0
+
+        if not whitespace and self.part_empty and not self.splits:
+            self.skip = code in UNSPLIT_LINES
+        elif not whitespace and (code in MEMBER_ACCESS or self.after_comma) and not self.skip and not self.part_empty:
+            self.split_point(i)
+
+        value = token.value
+        width = self.width = self.width + len(value)
+        if '\n' in value:
+            # Multiline comment or text block, the line goes on at the column after its last line.
+            self.shift = len(value) - value.rfind('\n') - 1 - width
+            self.candidate = None
+        if whitespace:
+            return i + 1
+
+        self.visible_width = width
+        self.part_empty = False
+        self.after_comma = code == COMMA
+
+        if code in BRACKETS:
+            if code == LPAREN:
+                self.brackets.append([code, width + self.shift, i])
+            elif code == LBRACE:
+                self.brackets.append([code, None, i])
+            elif code == RPAREN:
+                self.close_bracket(LPAREN, LBRACE)
+            else:
+                self.close_bracket(LBRACE, None)
+
+        if width + self.shift > self.limit and self.candidate is not None:
+            self.split_at(*self.candidate)
+        return i + 1
+
+    def finish(self, tokens):
+        if self.splits:
+            self.split(tokens, self.line_start, len(tokens))
+
+    def state(self, offset):
+        state = super().state(offset)
+        # Brackets of earlier lines are only ever found to be before a split point, whatever their index.
+        state['brackets'] = [(code, column, index - offset if index >= self.line_start else None)
+                             for code, column, index in self.brackets]
+        state['line_start'] = self.line_start - offset
+        state['splits'] = [(i - offset, indent) for i, indent in self.splits]
+        if self.candidate is not None:
+            state['candidate'] = (self.candidate[0] - offset,) + self.candidate[1:]
+        return state
+
+    def column(self, width: int) -> int:
+        return width + self.shift
+
+    def split_point(self, i: int):
+        column = self.column(self.width)
+        indent = self.indent + self.split_indent
+        if self.brackets:
+            code, bracket_column, index = self.brackets[-1]
+            if code == LPAREN and bracket_column <= self.limit // 2:
+                indent = bracket_column
+        if indent >= column:
+            return
+
+        if self.column(self.visible_width) > self.limit and self.candidate is None:
+            # Too long already and there was no earlier point to split at.
+            self.split_at(i, indent, self.width)
+        else:
+            self.candidate = (i, indent, self.width)
+
+    def split_at(self, i: int, indent: int, width: int):
+        shift = indent - self.column(width)
+        for bracket in reversed(self.brackets):
+            if bracket[2] < i:
+                break
+            if bracket[1] is not None:
+                bracket[1] += shift
+
+        self.splits.append((i, indent))
+        self.shift = indent - width
+        self.candidate = None
+
+    def close_bracket(self, opening: int, barrier: Optional[int]):
+        for j in range(len(self.brackets) - 1, -1, -1):
+            code = self.brackets[j][0]
+            if code == opening:
+                del self.brackets[j:]
+                return
+            if code == barrier:
+                return
+
+    def split(self, tokens, start: int, end: int) -> int:
+        # Rewrites tokens[start:end] with the line breaks and returns the new end.
+        line = TokenUtils.slice(tokens, start, end)
+        result = []
+        previous = 0
+        for i, indent in self.splits:
+            result.extend(line[previous:i - start])
+            while result and type(result[-1]) is Whitespace:
+                result.pop()
+            result.append(LINE_BREAK)
+            result.append(TokenUtils.whitespace(indent))
+            previous = i - start
+        result.extend(line[previous:])
+
+        TokenUtils.replace(tokens, start, end, result)
+        return start + len(result)
+
+
+class RemoveRedundantLineBreaks(VectorizedStage):
+    option = 'remove_redundant_line_breaks'
+
+    def __init__(self, p: Properties, errors: List):
+        super().__init__(p, errors)
+        self.line_break_count = 0
+
+    def step(self, tokens, i):
+        if self.vectorized and len(tokens) - i >= vectorized.MIN_WINDOW:
+            return self.remove_redundant(tokens, i)
+
+        token = tokens[i]
+
+        if isinstance(token, LineBreak):
+            self.line_break_count += 1
+        elif not isinstance(token, Whitespace):
+            self.line_break_count = 0
+
+        while self.line_break_count > 2:
+            i += TokenUtils.remove_before_if_exists(tokens, i, Whitespace)
+            i += TokenUtils.remove_before_if_exists(tokens, i, LineBreak)
+            self.line_break_count -= 1
+
+        return i + 1
+
+    def remove_redundant(self, tokens, i):
+        # Same removals as step() at every line break it would make them at, for the rest of the window.
+        redundant, self.line_break_count = vectorized.redundant_line_breaks(TokenUtils.slice(tokens, i, len(tokens)),
+                                                                            self.line_break_count)
+        shift = 0
+        for j in redundant:
+            k = i + j + shift
+            removed = TokenUtils.remove_before_if_exists(tokens, k, Whitespace)
+            removed += TokenUtils.remove_before_if_exists(tokens, k + removed, LineBreak)
+            shift += removed
+
+        return len(tokens)
+
+
+STAGES = (
+    ClearSpaces,
+    ReplaceMultipleSpaces,
+    SpacesNearOperators,
+    SpaceAfterComma,
+    ClearLineBreaks,
+    LineBreakAfterSemicolon,
+    FormatBlockExpressions,
+    CurlyBracesFormatter,
+    SplitLongLines,
+    RemoveRedundantLineBreaks,
+)
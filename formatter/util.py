@@ -1,8 +1,20 @@
 from lexer.token import *
 
+# Tokens inserted by the stages are shared. They have no position and must never be changed in place,
+# stages replace tokens instead.
+INDENTS = tuple(Whitespace(' ' * width) for width in range(128))
+SPACE = INDENTS[1]
+LINE_BREAK = LineBreak('\n')
+
 
 class TokenUtils:
 
+    @staticmethod
+    def whitespace(width: int) -> Whitespace:
+        if 0 <= width < len(INDENTS):
+            return INDENTS[width]
+        return Whitespace(' ' * width)
+
     @staticmethod
     def has_before(tokens, i, type=None, value=None):
         if not 0 <= i < len(tokens):
@@ -56,6 +68,19 @@ class TokenUtils:
             else:
                 tokens.insert(i + 1, token_to_add)
 
+    @staticmethod
+    def slice(tokens, start, end) -> list:
+        if isinstance(tokens, list):
+            return tokens[start:end]
+        return tokens.slice(start, end)
+
+    @staticmethod
+    def replace(tokens, start, end, tokens_to_add):
+        if isinstance(tokens, list):
+            tokens[start:end] = tokens_to_add
+        else:
+            tokens.replace(start, end, tokens_to_add)
+
     @staticmethod
     def remove_after_if_exists(tokens, i, type):
         if TokenUtils.has_after(tokens, i, type):
@@ -1,10 +1,53 @@
 import re
+from array import array
+from bisect import bisect_right
 from collections import namedtuple
+from itertools import accumulate
 
 from .token import *
 
 Position = namedtuple('Position', ['line', 'column'])
 
+SPACES = tuple(' ' * width for width in range(128))
+
+
+class LineIndex:
+    # Start offsets of the lines of a source, built once so that offsets map to lines with a binary search
+    # instead of scanning the text. Lines are 1-based and columns count from 1, like token positions.
+
+    def __init__(self, source: str):
+        self.source = source
+        self.length = len(source)
+        self.starts = array('q', accumulate(map(len, source.split('\n')),
+                                            lambda start, length: start + length + 1, initial=0))
+        # The last value is one past the end of the source.
+        self.starts.pop()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, offset: int) -> int:
+        return bisect_right(self.starts, offset)
+
+    def position(self, offset: int) -> Position:
+        line = bisect_right(self.starts, offset)
+        return Position(line, offset - self.starts[line - 1] + 1)
+
+    def start(self, line: int) -> int:
+        # Lines after the last one start at the end of the source.
+        return self.starts[line - 1] if line <= len(self.starts) else self.length
+
+    def end(self, line: int) -> int:
+        # Offset right after the line break of `line`.
+        return self.start(line + 1)
+
+    def text(self, line: int) -> str:
+        return self.source[self.start(line):self.end(line)].rstrip('\n')
+
+    def newlines(self, start: int, end: int) -> int:
+        # Number of line breaks in source[start:end].
+        return bisect_right(self.starts, end) - bisect_right(self.starts, start)
+
 
 class LexerError(Exception):
 
@@ -12,33 +55,59 @@ class LexerError(Exception):
         super().__init__(message)
 
 
+def _operators_by_length():
+    operators = [set() for i in range(0, Operator.MAX_LEN)]
+    for v in Operator.VALUES:
+        operators[len(v) - 1].add(v)
+    return tuple(frozenset(values) for values in operators)
+
+
 class Lexer:
     whitespace_pattern = re.compile(r'[^\n\S]+')
+    separators = frozenset(Separator.VALUES)
+    # Shared by every lexer instance, indexed by operator length - 1.
+    operators = _operators_by_length()
 
-    def __init__(self, source: str):
+    def __init__(self, source: str, lines: LineIndex = None):
         self.source = source
         self.errors = []
 
         self.current_line = 1
         self.start_of_line = -1
 
-        self.operators = [set() for i in range(0, Operator.MAX_LEN)]
-
-        for v in Operator.VALUES:
-            self.operators[len(v) - 1].add(v)
-
         self.length = len(self.source)
+        self.start = 0
         self.i = 0
         self.j = 0
+        # An index of the same source can be shared between lexers.
+        self._lines = lines
+        self._error_line = (0, '')
+
+    @staticmethod
+    def create(source: str, engine: str = 'regex', lines: LineIndex = None) -> 'Lexer':
+        return ENGINES[engine](source, lines)
 
     @staticmethod
-    def get_tokens(source: str):
-        lexer = Lexer(source)
+    def get_tokens(source: str, engine: str = 'regex'):
+        lexer = Lexer.create(source, engine)
         return lexer.tokens
 
+    @property
+    def lines(self) -> LineIndex:
+        # Built on first use, most sources are lexed without looking anything up.
+        if self._lines is None:
+            self._lines = LineIndex(self.source)
+        return self._lines
+
     def reset(self):
-        self.i = 0
-        self.j = 0
+        self.i = self.start
+        self.j = self.start
+
+    def seek(self, offset: int, line: int):
+        # Start lexing at the beginning of a line, e.g. right after a line break token.
+        self.start = offset
+        self.current_line = line
+        self.start_of_line = offset - 1
 
     @property
     def tokens(self):
@@ -46,73 +115,88 @@ class Lexer:
 
         length = len(self.source)
         while self.i < length:
+            token_type = self.read_token()
 
-            current_character = self.source[self.i]
-            lookahead = None
-            startswith = current_character
+            if token_type is None:
+                self.i = self.i + 1
+                continue
 
-            if self.i + 1 < length:
-                lookahead = self.source[self.i + 1]
-                startswith = current_character + lookahead
+            position = Position(self.current_line, self.i - self.start_of_line)
+            self.current_line += self.source.count('\n', self.i, self.j)
 
-            if current_character == '\n':
-                token_type = LineBreak
-                self.j = self.i + 1
-                self.start_of_line = self.i
-                # self.current_line += 1
+            token = token_type(self.source[self.i:self.j], position)
+            yield token
 
-            elif current_character.isspace():
-                token_type = Whitespace
-                self.read_whitespace()
+            self.i = self.j
 
-            elif startswith in ("//", "/*"):
-                token_type = Comment
-                self.read_comment()
+    def read_token(self):
+        current_character = self.source[self.i]
+        lookahead = None
+        startswith = current_character
 
-            elif startswith == '..' and self.try_operator():
-                token_type = Operator
+        if self.i + 1 < self.length:
+            lookahead = self.source[self.i + 1]
+            startswith = current_character + lookahead
 
-            elif current_character == '@':
-                token_type = Annotation
-                self.j = self.i + 1
+        if current_character == '\n':
+            token_type = LineBreak
+            self.j = self.i + 1
+            self.start_of_line = self.i
+            # self.current_line += 1
 
-            elif current_character == '.' and lookahead and lookahead.isdigit():
-                token_type = self.read_decimal_float_or_integer()
+        elif current_character.isspace():
+            token_type = Whitespace
+            self.read_whitespace()
 
-            elif self.try_separator():
-                token_type = Separator
+        elif startswith in ("//", "/*"):
+            token_type = Comment
+            self.read_comment()
 
-            elif current_character in ("'", '"'):
-                token_type = String
-                self.read_string()
+        elif startswith == '..' and self.try_operator():
+            token_type = Operator
 
-            elif current_character in '0123456789':
-                token_type = self.read_integer_or_float(current_character, lookahead)
+        elif current_character == '@':
+            token_type = Annotation
+            self.j = self.i + 1
 
-            elif self.is_java_identifier_start(current_character):
-                token_type = self.read_identifier()
+        elif current_character == '.' and lookahead and lookahead.isdigit():
+            token_type = self.read_decimal_float_or_integer()
 
-            elif self.try_operator():
-                token_type = Operator
+        elif self.try_separator():
+            token_type = Separator
 
-            else:
-                self.error('Could not process token', current_character)
-                self.i = self.i + 1
-                continue
+        elif current_character in ("'", '"'):
+            token_type = String
+            self.read_string()
 
-            position = Position(self.current_line, self.i - self.start_of_line)
-            self.current_line += self.source.count('\n', self.i, self.j)
+        elif current_character in '0123456789':
+            token_type = self.read_integer_or_float(current_character, lookahead)
 
-            token = token_type(self.source[self.i:self.j], position)
-            yield token
+        elif self.is_java_identifier_start(current_character):
+            token_type = self.read_identifier()
 
-            self.i = self.j
+        elif self.try_operator():
+            token_type = Operator
+
+        else:
+            self.error('Could not process token', current_character)
+            return None
+
+        return token_type
+
+    @property
+    def spans(self):
+        for token in self.tokens:
+            yield token, self.i, self.j
 
     def error(self, message, char=None):
         # Provide additional information in the errors message
-        line_start = self.source.rfind('\n', 0, self.i) + 1
-        line_end = self.source.find('\n', self.i)
-        line = self.source[line_start:line_end].strip()
+        # Errors tend to come in runs on one line, its text is looked up once.
+        lines = self.lines
+        number = lines.line(self.i)
+        if self._error_line[0] != number:
+            self._error_line = (number, self.source[lines.start(number):lines.end(number) - 1].strip())
+        line = self._error_line[1]
 
         line_number = self.current_line
 
@@ -129,15 +213,8 @@ class Lexer:
         if not match:
             return
 
-        i = match.end()
-
-        start_of_line = self.source.rfind('\n', self.i, i)
-
-        if start_of_line != -1:
-            self.start_of_line = start_of_line
-            self.current_line += self.source.count('\n', self.i, i)
-
-        self.j = i
+        # The pattern stops at line breaks, those are tokens of their own.
+        self.j = match.end()
 
     def read_string(self):
         delim = self.source[self.i]
@@ -322,7 +399,7 @@ class Lexer:
             return self.read_decimal_float_or_integer()
 
     def try_separator(self):
-        if self.source[self.i] in Separator.VALUES:
+        if self.source[self.i] in self.separators:
             self.j = self.i + 1
             return True
         return False
@@ -336,20 +413,117 @@ class Lexer:
         while self.j < len(self.source) and self.source[self.j].isalnum():
             self.j += 1
 
-        ident = self.source[self.i:self.j]
-        if ident in Keyword.VALUES:
-            token_type = Keyword
+        return self.classify_identifier(self.source[self.i:self.j])
 
-            if ident in BasicType.VALUES:
-                token_type = BasicType
-            elif ident in Modifier.VALUES:
-                token_type = Modifier
+    @staticmethod
+    def classify_identifier(ident: str):
+        return RESERVED.get(ident, Identifier)
+
+
+class RegexLexer(Lexer):
+    # Matches the common tokens with one compiled pattern. Anything the pattern does not accept as is
+    # (numbers other than plain integers, strings with octal escapes, unterminated literals and
+    # comments, invalid characters) is read by the character based lexer from the same position.
+    pattern = re.compile('|'.join((
+        r'(?P<line_break>\n)',
+        r'(?P<spaces> +(?![^\n\S]))',
+        r'(?P<whitespace>[^\n\S]+)',
+        r'(?P<comment>//[^\n]*(?=\n)|/\*[\s\S]*?\*/)',
+        r'(?P<ellipsis>\.\.\.)',
+        r'(?P<annotation>@)',
+        r'(?P<separator>[(){}\[\];,]|\.(?![0-9]|[^\x00-\x7f]))',
+        r'(?P<string>"(?:[^"\\]|\\[btnfru"\'\\])*"|\'(?:[^\'\\]|\\[btnfru"\'\\])*\')',
+        r'(?P<integer>(?:0|[1-9][0-9]*)(?=[^0-9_.eEfFdDlLxXbB]))',
+        r'(?P<identifier>[^\W\d_][^\W_]*)',
+        r'(?P<operator>(?!/[*/])(?:{}))'.format(
+            '|'.join(re.escape(v) for v in sorted(Operator.VALUES, key=len, reverse=True))),
+    )))
+
+    token_types = {
+        'spaces': Whitespace,
+        'whitespace': Whitespace,
+        'comment': Comment,
+        'ellipsis': Operator,
+        'annotation': Annotation,
+        'separator': Separator,
+        'string': String,
+        'integer': DecimalInteger,
+        'operator': Operator,
+    }
 
-        elif ident in Boolean.VALUES:
-            token_type = Boolean
-        elif ident == 'null':
-            token_type = Null
-        else:
-            token_type = Identifier
+    @property
+    def tokens(self):
+        self.reset()
 
-        return token_type
+        source = self.source
+        length = self.length
+        match_token = self.pattern.match
+        token_types = self.token_types
+        spaces = SPACES
+
+        while self.i < length:
+            i = self.i
+            match = match_token(source, i)
+            kind = match.lastgroup if match is not None else None
+
+            if kind == 'line_break':
+                self.j = i + 1
+                self.start_of_line = i
+                position = Position(self.current_line, 0)
+                self.current_line += 1
+
+                yield LineBreak('\n', position)
+
+                self.i = self.j
+                continue
+
+            token_type = token_types.get(kind)
+            if token_type is not None:
+                j = self.j = match.end()
+                multiline = token_type is Comment or token_type is String
+                # Indentation is mostly the same few runs of spaces, those share one string each.
+                value = spaces[j - i] if kind == 'spaces' and j - i < len(spaces) else source[i:j]
+            else:
+                token_type = self.read_token(match)
+                if token_type is None:
+                    self.i = i + 1
+                    continue
+                j = self.j
+                multiline = True
+                value = source[i:j]
+
+            position = Position(self.current_line, i - self.start_of_line)
+            if multiline:
+                self.current_line += source.count('\n', i, j)
+
+            yield token_type(value, position)
+
+            self.i = self.j
+
+    def read_token(self, match=None):
+        if match is None:
+            match = self.pattern.match(self.source, self.i)
+
+        if match is None:
+            return super().read_token()
+
+        kind = match.lastgroup
+        if kind == 'identifier' and not self.source[self.i].isalpha():
+            return super().read_token()
+
+        self.j = match.end()
+
+        if kind == 'identifier':
+            return self.classify_identifier(match.group())
+
+        if kind == 'line_break':
+            self.start_of_line = self.i
+            return LineBreak
+
+        return self.token_types[kind]
+
+
+ENGINES = {
+    'char': Lexer,
+    'regex': RegexLexer,
+}
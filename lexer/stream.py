@@ -0,0 +1,69 @@
+import codecs
+import io
+
+from .lexer import Lexer
+from .token import LineBreak
+
+
+class StreamLexer:
+    # Lexes a file object chunk by chunk. The text is lexed up to the last line break read so far:
+    # tokens never look past a line break, so every token up to the last line break token is final.
+    # The rest (the unfinished last line, or an unterminated comment or string that swallowed it)
+    # is carried over and lexed again together with the next chunk.
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, reader, engine: str = 'regex', chunk_size: int = CHUNK_SIZE, encoding: str = 'utf-8'):
+        self.reader = reader
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.errors = []
+
+    def read_chunks(self):
+        decoder = None
+        while True:
+            data = self.reader.read(self.chunk_size)
+
+            if isinstance(data, (bytes, bytearray)):
+                if decoder is None:
+                    # Line breaks translated like a file read in text mode.
+                    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(self.encoding)(), True)
+                chunk = decoder.decode(data, final=not data)
+            else:
+                chunk = data
+
+            if chunk:
+                yield chunk
+            if not data:
+                break
+
+    @property
+    def tokens(self):
+        carry = ''
+        line = 1
+
+        for chunk in self.read_chunks():
+            buffer = carry + chunk
+            if '\n' not in chunk:
+                carry = buffer
+                continue
+
+            lexer = Lexer.create(buffer[:buffer.rfind('\n') + 1], self.engine)
+            lexer.current_line = line
+
+            pending = []
+            cut, cut_errors = 0, 0
+            for token in lexer.tokens:
+                pending.append(token)
+                if type(token) is LineBreak:
+                    yield from pending
+                    pending = []
+                    cut, cut_errors, line = lexer.j, len(lexer.errors), lexer.current_line
+
+            self.errors.extend(lexer.errors[:cut_errors])
+            carry = buffer[cut:]
+
+        lexer = Lexer.create(carry, self.engine)
+        lexer.current_line = line
+        yield from lexer.tokens
+        self.errors.extend(lexer.errors)
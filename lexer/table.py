@@ -0,0 +1,140 @@
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+from .lexer import Lexer, Position
+from .token import TOKEN_TYPES, KINDS
+
+# Binary form of a table: the header, the kinds as bytes padded to a multiple of 4, then starts, ends,
+# lines and columns as unsigned 32-bit integers in the byte order of the machine that wrote it.
+# Header: magic, format version, byte order (0 little, 1 big), integer size, token types checksum and
+# number of tokens. Kinds index TOKEN_TYPES, so tables written with other token types are rejected.
+HEADER = struct.Struct('<4sBBBxII')
+MAGIC = b'JTOK'
+FORMAT_VERSION = 1
+BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+TYPES_CHECKSUM = zlib.crc32(' '.join(token_type.__name__ for token_type in TOKEN_TYPES).encode())
+
+
+class TokenView:
+    # Lightweight handle to one row of a TokenTable, the value is only sliced from the source when asked for.
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: 'TokenTable', index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def type(self):
+        return TOKEN_TYPES[self.table.kinds[self.index]]
+
+    @property
+    def start(self) -> int:
+        return self.table.starts[self.index]
+
+    @property
+    def end(self) -> int:
+        return self.table.ends[self.index]
+
+    @property
+    def value(self) -> str:
+        return self.table.value(self.index)
+
+    @property
+    def position(self) -> Position:
+        return self.table.position(self.index)
+
+    def __repr__(self) -> str:
+        return '{}[{}:{}]'.format(self.type.__name__, self.start, self.end)
+
+
+class TokenTable:
+    # Lexer output stored column-wise: one array per field instead of one object per token. Tables read
+    # with from_buffer() hold read-only memoryviews over the buffer instead of arrays.
+
+    def __init__(self, source: str):
+        self.source = source
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.lines = array('I')
+        self.columns = array('I')
+
+    @staticmethod
+    def from_source(source: str, engine: str = 'regex') -> 'TokenTable':
+        table = TokenTable(source)
+        for token, start, end in Lexer.create(source, engine).spans:
+            table.append(KINDS[type(token)], start, end, token.position)
+        return table
+
+    def append(self, kind: int, start: int, end: int, position: Position):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(position.line)
+        self.columns.append(position.column)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self):
+        source = self.source
+        for kind, start, end, line, column in zip(self.kinds, self.starts, self.ends, self.lines, self.columns):
+            yield TOKEN_TYPES[kind](source[start:end], Position(line, column))
+
+    def value(self, i: int) -> str:
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def position(self, i: int) -> Position:
+        return Position(self.lines[i], self.columns[i])
+
+    def token(self, i: int):
+        return TOKEN_TYPES[self.kinds[i]](self.value(i), self.position(i))
+
+    def view(self, i: int) -> TokenView:
+        if not 0 <= i < len(self.kinds):
+            raise IndexError('token index out of range')
+        return TokenView(self, i)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in
+                   (self.kinds, self.starts, self.ends, self.lines, self.columns))
+
+    def to_bytes(self) -> bytes:
+        count = len(self.kinds)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER, array('I').itemsize, TYPES_CHECKSUM, count)
+        # Arrays and memoryviews are joined as their raw bytes.
+        return b''.join((header, self.kinds, bytes(-count % 4), self.starts, self.ends, self.lines, self.columns))
+
+    @staticmethod
+    def from_buffer(source: str, buffer) -> 'TokenTable':
+        # Reads a table written by to_bytes() from bytes or an mmap without copying it. `source` must be
+        # the text it was lexed from.
+        data = memoryview(buffer).cast('B')
+        if len(data) < HEADER.size:
+            raise ValueError('Token table is truncated.')
+
+        magic, version, byte_order, itemsize, checksum, count = HEADER.unpack_from(data)
+        if (magic, version, byte_order, itemsize, checksum) != \
+                (MAGIC, FORMAT_VERSION, BYTE_ORDER, array('I').itemsize, TYPES_CHECKSUM):
+            raise ValueError('Token table was written by an incompatible lexer or machine.')
+
+        start = HEADER.size + count + -count % 4
+        if len(data) != start + 4 * itemsize * count:
+            raise ValueError('Token table is truncated.')
+
+        table = TokenTable(source)
+        table.kinds = data[HEADER.size:HEADER.size + count]
+        size = itemsize * count
+        table.starts, table.ends, table.lines, table.columns = \
+            (data[start + k * size:start + (k + 1) * size].cast('I') for k in range(4))
+        return table
+
+    @staticmethod
+    def load(source: str, path: str) -> 'TokenTable':
+        # Memory-maps a table saved with to_bytes(), the columns are paged in as they are read.
+        with open(path, 'rb') as file:
+            return TokenTable.from_buffer(source, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
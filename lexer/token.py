@@ -2,38 +2,47 @@ from util.util import Representable
 
 
 class Token(Representable):
+    __slots__ = ('value', 'position', 'code')
 
     def __init__(self, value, position=None):
         self.value = value
         self.position = position
+        # Stands for the value in dispatch tables, see CODES. Only whitespace values are ever changed in
+        # place, and those have no code.
+        self.code = CODES.get(value, 0)
+
+    def _fields(self):
+        return ('value', self.value), ('position', self.position)
 
     def __eq__(self, other: object) -> bool:
         if type(other) is type(self):
-            return self.__dict__ == other.__dict__
+            return self.value == other.value and self.position == other.position
         return False
 
 
 class Whitespace(Token):
-    pass
+    __slots__ = ()
 
 
 class ImportantWhitespace(Token):
-    pass
+    __slots__ = ()
 
 
 class LineBreak(Token):
-    pass
+    __slots__ = ()
 
 
 class Comment(Token):
-    pass
+    __slots__ = ()
 
 
 class EndOfInput(Token):
-    pass
+    __slots__ = ()
 
 
 class Keyword(Token):
+    __slots__ = ()
+
     VALUES = ('abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 'class', 'const', 'continue',
               'default', 'do', 'double', 'else', 'enum', 'extends', 'final', 'finally', 'float', 'for', 'goto', 'if',
               'implements', 'import', 'instanceof', 'int', 'interface', 'long', 'native', 'new', 'package', 'private',
@@ -42,71 +51,81 @@ class Keyword(Token):
 
 
 class Modifier(Keyword):
+    __slots__ = ()
+
     VALUES = ('abstract', 'default', 'final', 'native', 'private', 'protected', 'public', 'static', 'strictfp',
               'synchronized', 'transient', 'volatile')
 
 
 class BasicType(Keyword):
+    __slots__ = ()
+
     VALUES = ('boolean', 'byte', 'char', 'double', 'float', 'int', 'long', 'short')
 
 
 class Literal(Token):
-    pass
+    __slots__ = ()
 
 
 class Integer(Literal):
-    pass
+    __slots__ = ()
 
 
 class DecimalInteger(Literal):
-    pass
+    __slots__ = ()
 
 
 class OctalInteger(Integer):
-    pass
+    __slots__ = ()
 
 
 class BinaryInteger(Integer):
-    pass
+    __slots__ = ()
 
 
 class HexInteger(Integer):
-    pass
+    __slots__ = ()
 
 
 class FloatingPoint(Literal):
-    pass
+    __slots__ = ()
 
 
 class DecimalFloatingPoint(FloatingPoint):
-    pass
+    __slots__ = ()
 
 
 class HexFloatingPoint(FloatingPoint):
-    pass
+    __slots__ = ()
 
 
 class Boolean(Literal):
+    __slots__ = ()
+
     VALUES = ('true', 'false')
 
 
 class Character(Literal):
-    pass
+    __slots__ = ()
 
 
 class String(Literal):
-    pass
+    __slots__ = ()
 
 
 class Null(Literal):
-    pass
+    __slots__ = ()
 
 
 class Separator(Token):
+    __slots__ = ()
+
     VALUES = ('(', ')', '{', '}', '[', ']', ';', ',', '.')
 
 
 class Operator(Token):
+    __slots__ = ()
+
     MAX_LEN = 4
     VALUES = ('>>>=', '>>=', '<<=', '%=', '^=', '|=', '&=', '/=', '*=', '-=', '+=', '<<', '--', '++', '||', '&&', '!=',
               '>=', '<=', '==', '%', '^', '|', '&', '/', '*', '-', '+', ':', '?', '~', '!', '<', '>', '=', '...', '->',
@@ -125,21 +144,57 @@ class Operator(Token):
     METHOD_REFERENCE = ('::',)
 
     def is_infix(self):
-        return self.value in self.INFIX
+        return FLAGS[self.code] & INFIX != 0
 
     def is_prefix(self):
-        return self.value in self.PREFIX
+        return FLAGS[self.code] & PREFIX != 0
 
     def is_postfix(self):
-        return self.value in self.POSTFIX
+        return FLAGS[self.code] & POSTFIX != 0
 
     def is_assignment(self):
-        return self.value in self.ASSIGNMENT
+        return FLAGS[self.code] & ASSIGNMENT != 0
 
 
 class Annotation(Token):
-    pass
+    __slots__ = ()
 
 
 class Identifier(Token):
-    pass
+    __slots__ = ()
+
+
+TOKEN_TYPES = (Whitespace, ImportantWhitespace, LineBreak, Comment, EndOfInput, Keyword, Modifier, BasicType, Literal,
+               Integer, DecimalInteger, OctalInteger, BinaryInteger, HexInteger, FloatingPoint, DecimalFloatingPoint,
+               HexFloatingPoint, Boolean, Character, String, Null, Separator, Operator, Annotation, Identifier)
+
+KINDS = {token_type: kind for kind, token_type in enumerate(TOKEN_TYPES)}
+
+# Small integer code of every line break, keyword, literal keyword, separator and operator value, 0 for any
+# other value. Codes depend on the value only, like the string comparisons they replace.
+CODES = {value: code for code, value in enumerate(dict.fromkeys(
+    ('\n',) + Keyword.VALUES + Boolean.VALUES + ('null',) + Separator.VALUES + Operator.VALUES + Operator.INFIX), 1)}
+
+INFIX = 1
+PREFIX = 2
+POSTFIX = 4
+ASSIGNMENT = 8
+
+
+def _operator_flags():
+    flags = [0] * (len(CODES) + 1)
+    for flag, values in ((INFIX, Operator.INFIX), (PREFIX, Operator.PREFIX), (POSTFIX, Operator.POSTFIX),
+                         (ASSIGNMENT, Operator.ASSIGNMENT)):
+        for value in values:
+            flags[CODES[value]] |= flag
+    return flags
+
+
+# Operator flags indexed by code.
+FLAGS = _operator_flags()
+
+# Token type of every identifier the lexer does not read as Identifier.
+RESERVED = {value: BasicType if value in BasicType.VALUES else Modifier if value in Modifier.VALUES else Keyword
+            for value in Keyword.VALUES}
+RESERVED.update((value, Boolean) for value in Boolean.VALUES)
+RESERVED['null'] = Null
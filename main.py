@@ -1,27 +1,163 @@
 import argparse
+import json
+import os
+import sys
 
-from formatter.formatter import Formatter
-from util.util import SourceFile, Properties
+from formatter import OUTPUT_VERSION
+from formatter.client import DaemonClient
+from util.util import SourceFile, Properties, Helpers, WriteBatch
 
-parser = argparse.ArgumentParser(description='Code formatter for Java.')
 
-parser.add_argument('input', type=str, help='File to format.')
-parser.add_argument('properties', type=str, help='Properties for formatter.')
+def format_with_daemon(args) -> bool:
+    # Returns False if no daemon of this version is running, the caller then formats in this process.
+    client = DaemonClient.connect(args.socket)
+    if client is None:
+        return False
 
-parser.add_argument('--print', help='Print to standard output.', action='store_true')
-parser.add_argument('--output', type=str,
-                    help='Output file. If not specified, formatted file will be written to the input file.')
+    with client:
+        if client.ping() != OUTPUT_VERSION:
+            # Another version formats differently.
+            return False
 
-args = parser.parse_args()
+        if args.print or args.output is not None:
+            result = client.format(args.properties, path=args.input[0], output=None if args.print else args.output)
 
-file = SourceFile(args.input)
-result = Formatter.format(file.read_all(), Properties(args.properties))
+            print('\n'.join(result.errors))
+            if args.print:
+                print(result.code)
+            return True
 
-if args.print:
-    print('\n'.join(result.errors))
-    print(result.code)
-elif args.output is not None:
-    print('\n'.join(result.errors))
-    SourceFile(args.output).replace_all(result.code)
-else:
-    file.replace_all(result.code)
+        results = [client.format_file(args.properties, path) for path in Helpers.collect_files(args.input)]
+
+    print(Helpers.summary(results))
+    if any(result.failure is not None for result in results):
+        sys.exit(1)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Code formatter for Java.')
+
+    parser.add_argument('input', type=str, nargs='+', help='Files, directories or glob patterns to format.')
+    parser.add_argument('properties', type=str, help='Properties for formatter.')
+
+    parser.add_argument('--print', help='Print to standard output.', action='store_true')
+    parser.add_argument('--output', type=str,
+                        help='Output file. If not specified, formatted file will be written to the input file.')
+    parser.add_argument('--legacy', help='Run formatter stages one after another instead of the fused pipeline.',
+                        action='store_true')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of processes formatting files in parallel. A single large file is split into '
+                             'parts formatted in parallel.')
+    parser.add_argument('--cache', type=str,
+                        help='Directory for cached results and lexer output of already formatted files. Lexer '
+                             'output is reused when only the properties change.')
+    parser.add_argument('--cache-size', type=int, default=64, help='Cache size limit in megabytes, 64 by default.')
+    parser.add_argument('--stream', help='Read, format and write files in chunks instead of loading them whole.',
+                        action='store_true')
+    parser.add_argument('--fsync', action='store_true',
+                        help='Sync written files to disk before replacing the originals, in batches of files.')
+    parser.add_argument('--socket', type=str,
+                        help='Socket of a running formatting daemon, see daemon.py. Files are formatted in this '
+                             'process if no daemon of this version is running.')
+    parser.add_argument('--no-daemon', help='Always format in this process.', action='store_true')
+    parser.add_argument('--check', action='store_true',
+                        help='Only report files that are not formatted, with the first line that would change. Files '
+                             'are not written, exits with status 1 if any file is not formatted.')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', metavar='JSON',
+                        help='Print time and token changes of every formatter stage, or save them as JSON.')
+
+    args = parser.parse_args()
+
+    if args.print or args.output is not None:
+        if len(args.input) != 1:
+            parser.error('--print and --output expect a single input file')
+        if args.check:
+            parser.error('--check does not write output')
+
+    # The daemon formats with the fused pipeline and its own cache, one file at a time.
+    use_daemon = not (args.no_daemon or args.legacy or args.stream or args.jobs > 1 or args.profile or args.check
+                      or args.fsync)
+    if use_daemon and format_with_daemon(args):
+        return
+
+    # Deferred, so that a client talking to the daemon never loads the formatter.
+    from formatter.formatter import Formatter
+    from formatter.profile import Profiler
+    from formatter.runner import Runner
+
+    profiler = Profiler() if args.profile is not None else None
+
+    if args.print or args.output is not None:
+        file = SourceFile(args.input[0])
+        if args.stream:
+            with file.reader() as reader:
+                if args.print:
+                    result = Formatter.format_stream(reader, sys.stdout, Properties(args.properties),
+                                                     observer=profiler, encoding=file.encoding)
+                else:
+                    output = SourceFile(args.output, file.encoding)
+                    temp_path, writer = output.open_temporary()
+                    try:
+                        with writer:
+                            result = Formatter.format_stream(reader, writer, Properties(args.properties),
+                                                             observer=profiler, encoding=file.encoding)
+                    except BaseException:
+                        os.remove(temp_path)
+                        raise
+                    with WriteBatch(args.fsync) as batch:
+                        batch.commit(temp_path, args.output)
+
+            print('\n'.join(result.errors), file=sys.stderr)
+            report_profile(args.profile, profiler)
+            return
+
+        result = Formatter.format(file.read_all(), Properties(args.properties), fused=not args.legacy,
+                                  observer=profiler)
+
+        print('\n'.join(result.errors))
+        if args.print:
+            print(result.code)
+        else:
+            SourceFile(args.output, file.encoding).replace_all(result.code, fsync=args.fsync)
+        report_profile(args.profile, profiler)
+        return
+
+    paths = Helpers.collect_files(args.input)
+    if args.check:
+        results = list(Runner(args.properties, jobs=args.jobs, check=True).run(paths))
+
+        print(Helpers.check_summary(results))
+        if any(result.changed or result.failure is not None for result in results):
+            sys.exit(1)
+        return
+
+    runner = Runner(args.properties, jobs=args.jobs, fused=not args.legacy, cache_dir=args.cache,
+                    cache_size=args.cache_size * 1024 * 1024, stream=args.stream, profile=profiler is not None,
+                    fsync=args.fsync)
+    results = list(runner.run(paths))
+
+    print(Runner.summary(results))
+    if profiler is not None:
+        for result in results:
+            profiler.merge(result.stats)
+        report_profile(args.profile, profiler)
+
+    if any(result.failure is not None for result in results):
+        sys.exit(1)
+
+
+def report_profile(destination: str, profiler):
+    # The table goes to standard error, so it never mixes with code printed by --print.
+    if profiler is None:
+        return
+
+    if destination == '-':
+        print(profiler.table(), file=sys.stderr)
+    else:
+        with open(destination, 'w') as file:
+            json.dump(profiler.as_list(), file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
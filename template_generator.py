@@ -1,6 +1,6 @@
 import argparse
 
-from util.util import Properties
+from util.util import Properties, CONVERTERS, read_schema
 
 parser = argparse.ArgumentParser(description='Code formatter for Java. Properties generation utility.')
 
@@ -10,13 +10,14 @@ parser.add_argument('--schema', help='File with description of properties. "sche
                     default='schema.properties')
 
 args = parser.parse_args()
-properties = Properties(args.schema)
+# Read as a schema, not as Properties, which only accept the properties of the bundled schema.
+schema = read_schema(args.schema)
 
 new_properties_map = {}
-for key, value in properties.map.items():
+for key, (type_name, value) in schema.items():
     print('Option:', key)
     print('Default value:', value)
-    converter = Properties.converters.get(type(value).__name__)
+    converter = CONVERTERS[type_name]
     raw_input = input('Your value: ')
     if raw_input is None or raw_input == '':
         entered_value = value
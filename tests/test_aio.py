@@ -0,0 +1,102 @@
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import IsolatedAsyncioTestCase
+
+from formatter.aio import AsyncFormatter, format_async
+from formatter.formatter import Formatter
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestAsyncFormatter(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+        self.source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+        self.executor = ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_format_async(self):
+        result = await format_async(self.source, self.properties)
+
+        self.assertEqual(Formatter.format(self.source, self.properties).code, result.code)
+
+    async def test_format_many_keeps_order(self):
+        sources = ['int  a{}=1;\n'.format(i) for i in range(20)] + ['class A {{ int a;; }']
+        async with AsyncFormatter(self.properties, self.executor, max_concurrency=3) as formatter:
+            results = await formatter.format_all(sources)
+
+        for source, result in zip(sources, results):
+            expected = Formatter.format(source, self.properties)
+            self.assertEqual(expected.code, result.code)
+            self.assertListEqual(expected.errors, result.errors)
+
+    async def test_bounded_concurrency(self):
+        consumed = []
+
+        def sources():
+            for i in range(50):
+                consumed.append(i)
+                yield 'int a{};\n'.format(i)
+
+        formatter = AsyncFormatter(self.properties, self.executor, max_concurrency=4)
+        results = formatter.format_many(sources())
+        await results.__anext__()
+        self.assertLessEqual(len(consumed), 5)
+        await results.aclose()
+
+    async def test_timeout(self):
+        # Both workers are busy, so the request never starts.
+        release = threading.Event()
+        for i in range(2):
+            self.executor.submit(release.wait)
+
+        formatter = AsyncFormatter(self.properties, self.executor, timeout=0.05)
+        try:
+            with self.assertRaises(asyncio.TimeoutError):
+                await formatter.format(self.source)
+        finally:
+            release.set()
+
+        self.assertEqual(Formatter.format('int  a;\n', self.properties).code,
+                         (await formatter.format('int  a;\n')).code)
+
+    async def test_cancellation(self):
+        release = threading.Event()
+        for i in range(2):
+            self.executor.submit(release.wait)
+
+        formatter = AsyncFormatter(self.properties, self.executor)
+        task = asyncio.ensure_future(formatter.format(self.source))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        release.set()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+    async def test_format_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'A.java')
+            SourceFile(path).replace_all('int  a=1;\n')
+
+            async with AsyncFormatter(self.properties, self.executor) as formatter:
+                results = [result async for result in formatter.format_files(
+                    [path, os.path.join(directory, 'Missing.java')])]
+
+            self.assertTrue(results[0].changed)
+            self.assertEqual(SourceFile(path).read_all(), 'int a = 1;\n')
+            self.assertIsNone(results[0].failure)
+            self.assertIn('FileNotFoundError', results[1].failure)
+
+    async def test_process_pool(self):
+        async with AsyncFormatter(self.properties, max_concurrency=2) as formatter:
+            result = await formatter.format(self.source)
+
+        self.assertEqual(Formatter.format(self.source, self.properties).code, result.code)
@@ -0,0 +1,40 @@
+import os
+from unittest import TestCase
+
+from benchmarks.corpus import CorpusGenerator, SHAPES
+from benchmarks.suite import BenchmarkSuite, report, compare
+from formatter.formatter import Formatter
+from util.util import Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestBenchmarks(TestCase):
+
+    def setUp(self):
+        self.properties = os.path.join(TESTS_DIR, 'test.properties')
+
+    def test_corpus_is_reproducible(self):
+        for shape in SHAPES:
+            source = CorpusGenerator(7).generate(20000, shape)
+
+            self.assertEqual(source, CorpusGenerator(7).generate(20000, shape))
+            self.assertGreaterEqual(len(source), 20000)
+            self.assertListEqual(Formatter.format(source, Properties(self.properties)).errors, [])
+
+    def test_suite_reports_every_benchmark(self):
+        source = CorpusGenerator().generate(5000)
+        results = BenchmarkSuite(self.properties, repeat=1, run_main=False).run(source)
+
+        self.assertIn('lexer.regex', results)
+        self.assertIn('stage.SplitLongLines', results)
+        self.assertIn('format.fused', results)
+        for result in results.values():
+            self.assertGreater(result['tokens_per_sec'], 0)
+            self.assertGreater(result['peak_memory'], 0)
+
+    def test_compare(self):
+        old = report({}, {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}})
+        new = report({}, {'a': {'seconds': 1.05}, 'b': {'seconds': 1.5}, 'c': {'seconds': 1.0}})
+
+        self.assertListEqual([(c.name, c.regressed) for c in compare(old, new, 0.1)], [('a', False), ('b', True)])
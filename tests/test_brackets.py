@@ -0,0 +1,36 @@
+import os
+from unittest import TestCase
+
+from formatter.formatter import Formatter
+from lexer.lexer import Lexer
+from util.util import Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestBracketCounters(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def test_wrapper_on_lexer_tokens(self):
+        errors = []
+        tokens = Formatter.curly_braces_formatter(list(Lexer.get_tokens('class A { int a; }\n')), self.properties,
+                                                  errors)
+
+        self.assertEqual(''.join(token.value for token in tokens), 'class A {\n          int a;\n}\n')
+        self.assertListEqual(errors, [])
+
+    def test_unmatched_brace_is_reported(self):
+        result = Formatter.format('class A {\n}\n}\n', self.properties)
+
+        self.assertEqual(result.code, 'class A {\n}\n}\n')
+        self.assertListEqual(result.errors, ['Unexpected closing bracket at Position(line=3, column=1), '
+                                             'set indent to 0.'])
+
+    def test_unbalanced_condition_keeps_count(self):
+        # FormatBlockExpressions counts parentheses across block statements: a stray ')' keeps the condition
+        # open, also for the next block statement.
+        result = Formatter.format('if )(a)b();\nwhile(c)d();\n', self.properties)
+
+        self.assertEqual(result.code, 'if )(a)b();\nwhile (c)d();\n')
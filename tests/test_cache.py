@@ -0,0 +1,94 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from formatter.cache import ResultCache, TokenCache
+from formatter.formatter import Formatter
+from lexer.lexer import Lexer
+from util.util import Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name)
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_after_put(self):
+        source = 'int   a=1;\n'
+        self.assertIsNone(self.cache.get(source, self.properties))
+
+        self.cache.put(source, self.properties, Formatter.format(source, self.properties))
+        result = self.cache.get(source, self.properties)
+
+        self.assertEqual(result.code, 'int a = 1;\n')
+        self.assertListEqual(result.errors, [])
+
+    def test_unchanged_source_is_stored_without_code(self):
+        source = 'int a = 1;\n'
+        self.cache.put(source, self.properties, Formatter.format(source, self.properties))
+
+        self.assertEqual(self.cache.get(source, self.properties).code, source)
+
+    def test_key_depends_on_properties(self):
+        key = ResultCache.key('int a;\n', self.properties)
+        p = self.properties.replace(indent=self.properties.indent + 1)
+
+        self.assertNotEqual(key, ResultCache.key('int a;\n', p))
+
+    def test_evict_least_recently_used(self):
+        cache = ResultCache(self.directory.name, max_size=100)
+        sources = ['int a{} = 1;\n'.format(i) for i in range(10)]
+        for i, source in enumerate(sources):
+            cache.put(source, self.properties, Formatter.format(source, self.properties))
+            os.utime(cache._path(cache.key(source, self.properties)), (i, i))
+
+        cache.evict()
+
+        self.assertIsNone(cache.get(sources[0], self.properties))
+        self.assertIsNotNone(cache.get(sources[-1], self.properties))
+
+
+class TestTokenCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = TokenCache(self.directory.name)
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_tokens_are_reused_with_other_properties(self):
+        source = 'class A {\n  void f( int a ) { g(a,1); }\n}\n'
+        self.assertIsNone(self.cache.get(source))
+
+        self.assertListEqual(list(self.cache.tokens(source)), list(Lexer.get_tokens(source)))
+        table = self.cache.get(source)
+        p = self.properties.replace(indent=self.properties.indent + 2)
+
+        self.assertListEqual(list(table), list(Lexer.get_tokens(source)))
+        self.assertEqual(Formatter.format_tokens(table, p).code, Formatter.format(source, p).code)
+
+    def test_incompatible_entry_is_a_miss(self):
+        source = 'int a;\n'
+        list(self.cache.tokens(source))
+        with open(self.cache._path(self.cache.key(source)) + '.tokens', 'r+b') as file:
+            file.write(b'XXXX')
+
+        self.assertIsNone(self.cache.get(source))
+
+    def test_shares_directory_with_results(self):
+        source = 'int   a=1;\n'
+        results = ResultCache(self.directory.name)
+        results.put(source, self.properties, Formatter.format(source, self.properties))
+        list(self.cache.tokens(source))
+
+        self.assertEqual(results.get(source, self.properties).code, 'int a = 1;\n')
+        self.assertIsNotNone(self.cache.get(source))
@@ -0,0 +1,61 @@
+import os
+from unittest import TestCase
+
+from formatter.formatter import Formatter, CompiledFormatter
+from formatter.stages import SplitLongLines
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestCompiledFormatter(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+        sample = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+        self.sources = [sample, 'class A{int a;;}\n', 'class B {\n  }}\n', '', sample[:len(sample) // 2]]
+
+    def test_same_output_as_format(self):
+        for fused in (True, False):
+            results = list(Formatter.format_many(self.sources, self.properties, fused))
+
+            self.assertEqual(len(self.sources), len(results))
+            for source, result in zip(self.sources, results):
+                expected = Formatter.format(source, self.properties, fused)
+                self.assertEqual(expected.code, result.code)
+                self.assertListEqual(expected.errors, result.errors)
+
+    def test_stages_do_not_share_state(self):
+        formatter = CompiledFormatter(self.properties)
+
+        first = formatter.format('class B {\n  }}\n')
+        second = formatter.format('class A {\n}\n')
+
+        self.assertTrue(first.errors)
+        self.assertListEqual([], second.errors)
+        self.assertEqual(Formatter.format('class A {\n}\n', self.properties).code, second.code)
+
+    def test_yields_as_it_goes(self):
+        consumed = []
+
+        def sources():
+            for source in self.sources:
+                consumed.append(source)
+                yield source
+
+        results = Formatter.format_many(sources(), self.properties)
+        next(results)
+        self.assertEqual(1, len(consumed))
+
+    def test_disabled_stages_are_dropped(self):
+        p = self.properties.replace(split_long_lines=False)
+
+        self.assertNotIn(SplitLongLines, CompiledFormatter(p).stages)
+
+    def test_check(self):
+        for source in self.sources + ['int a = 1;\n', 'int a = 1;\n\n\n\nint b;\n', 'int a = 1;\nint b=2;\n']:
+            formatted = Formatter.format(source, self.properties).code
+            self.assertEqual(formatted == source, Formatter.check(source, self.properties) is None)
+
+        self.assertEqual(Formatter.check('int a = 1;\nint b=2;\n', self.properties),
+                         (2, 6, 'int b=2;', 'int b = 2;'))
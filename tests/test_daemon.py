@@ -0,0 +1,98 @@
+import os
+import stat
+import tempfile
+import threading
+from unittest import TestCase
+
+from formatter import OUTPUT_VERSION
+from formatter.client import DaemonClient, DaemonError, private_directory
+from formatter.daemon import FormatterDaemon
+from formatter.formatter import Formatter
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestDaemon(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, 'formatter.sock')
+        self.properties = os.path.join(TESTS_DIR, 'test.properties')
+
+        self.daemon = FormatterDaemon(self.socket_path)
+        self.thread = threading.Thread(target=self.daemon.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.directory.cleanup()
+
+    def test_format_content(self):
+        source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+        expected = Formatter.format(source, Properties(self.properties))
+
+        with DaemonClient.connect(self.socket_path) as client:
+            for i in range(2):
+                result = client.format(self.properties, content=source)
+                self.assertEqual(expected.code, result.code)
+                self.assertListEqual(expected.errors, result.errors)
+
+    def test_format_file_in_place(self):
+        path = os.path.join(self.directory.name, 'Messy.java')
+        SourceFile(path).replace_all('int   a=1;\n')
+
+        with DaemonClient.connect(self.socket_path) as client:
+            self.assertTrue(client.format_file(self.properties, path).changed)
+            self.assertFalse(client.format_file(self.properties, path).changed)
+            self.assertIsNotNone(client.format_file(self.properties, path + '.missing').failure)
+
+        self.assertEqual(SourceFile(path).read_all(), 'int a = 1;\n')
+
+    def test_output_keeps_encoding(self):
+        path = os.path.join(self.directory.name, 'Latin.java')
+        output = os.path.join(self.directory.name, 'Formatted.java')
+        with open(path, 'wb') as file:
+            file.write('String  s="été";\n'.encode('latin-1'))
+
+        with DaemonClient.connect(self.socket_path) as client:
+            client.format(self.properties, path=path, output=output)
+
+        with open(output, 'rb') as file:
+            self.assertEqual(file.read(), 'String s = "été";\n'.encode('latin-1'))
+
+    def test_concurrent_clients(self):
+        results = []
+
+        def run():
+            with DaemonClient.connect(self.socket_path) as client:
+                results.append(client.format(self.properties, content='a  =b;\n').code)
+
+        threads = [threading.Thread(target=run) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertListEqual(results, ['a = b;\n'] * 8)
+
+    def test_errors_and_missing_daemon(self):
+        with DaemonClient.connect(self.socket_path) as client:
+            self.assertRaises(DaemonError, lambda: client.request(command='unknown'))
+            self.assertEqual(client.ping(), OUTPUT_VERSION)
+
+        self.assertIsNone(DaemonClient.connect(self.socket_path + '.missing'))
+        self.assertRaises(RuntimeError, lambda: FormatterDaemon(self.socket_path))
+
+    def test_socket_is_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+
+        shared = os.path.join(self.directory.name, 'shared')
+        os.mkdir(shared)
+        os.chmod(shared, 0o755)
+        self.assertRaises(DaemonError, lambda: private_directory(shared))
+
+        created = os.path.join(self.directory.name, 'created')
+        self.assertEqual(private_directory(created), created)
+        self.assertEqual(stat.S_IMODE(os.stat(created).st_mode), 0o700)
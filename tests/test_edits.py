@@ -0,0 +1,38 @@
+import os
+from unittest import TestCase
+
+from formatter.edits import apply_edits
+from formatter.formatter import Formatter
+from util.util import SourceFile, Properties, TextEdit
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestEdits(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def test_edits_reproduce_formatted_code(self):
+        source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+        expected = Formatter.format(source, self.properties)
+
+        result = Formatter.format_edits(source, self.properties, apply=True)
+
+        self.assertEqual(expected.code, result.code)
+        self.assertEqual(expected.code, apply_edits(source, result.edits))
+        self.assertListEqual(expected.errors, result.errors)
+
+    def test_only_changed_whitespace_is_reported(self):
+        result = Formatter.format_edits('a  =b;\n', self.properties)
+
+        self.assertIsNone(result.code)
+        self.assertListEqual(result.edits, [TextEdit(1, '  ', ' '), TextEdit(4, '', ' ')])
+
+    def test_formatted_source_has_no_edits(self):
+        source = Formatter.format('int a=1;\n', self.properties).code
+
+        self.assertListEqual(Formatter.format_edits(source, self.properties).edits, [])
+
+    def test_apply_rejects_stale_edits(self):
+        self.assertRaises(ValueError, lambda: apply_edits('a = b;', [TextEdit(1, '  ', ' ')]))
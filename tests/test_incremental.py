@@ -0,0 +1,70 @@
+import os
+from unittest import TestCase
+
+from formatter.formatter import Formatter
+from formatter.incremental import RangeFormatter, common_prefix_length
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestIncremental(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+        self.source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all() * 4
+
+    def expected_edits(self, source, start_line, end_line):
+        lines = source.split('\n')
+        range_start = len('\n'.join(lines[:start_line - 1])) + 1
+        range_end = len('\n'.join(lines[:end_line])) + 1
+
+        edits = Formatter.format_edits(source, self.properties).edits
+        return [edit for edit in edits if edit.offset < range_end and
+                (edit.offset >= range_start or edit.offset + len(edit.old) > range_start)]
+
+    def test_range_matches_full_format(self):
+        for start_line, end_line in [(1, 1), (10, 25), (40, 40), (90, 130)]:
+            result = Formatter.format_range(self.source, start_line, end_line, self.properties)
+            self.assertListEqual(self.expected_edits(self.source, start_line, end_line), result.edits)
+
+    def test_checkpoints_survive_edits(self):
+        RangeFormatter.CHECKPOINT_LINES = 10
+        try:
+            formatter = RangeFormatter(self.properties)
+            formatter.format_range(self.source, 1, self.source.count('\n'))
+            self.assertGreater(len(formatter.checkpoints), 10)
+
+            line = 100
+            offset = len('\n'.join(self.source.split('\n')[:line - 1])) + 1
+            source = self.source[:offset] + '   int  x=1;\n' + self.source[offset:]
+
+            result = formatter.format_range(source, line, line + 2, apply=True)
+            offsets = [checkpoint.offset for checkpoint in formatter.checkpoints]
+            self.assertListEqual(sorted(set(offsets)), offsets)
+            self.assertListEqual(self.expected_edits(source, line, line + 2), result.edits)
+        finally:
+            RangeFormatter.CHECKPOINT_LINES = 200
+
+    def test_checkpoints_hold_no_edits(self):
+        # Snapshots copy the state that formatting goes on from, not the edits and errors found before them.
+        RangeFormatter.CHECKPOINT_LINES = 10
+        try:
+            formatter = RangeFormatter(self.properties)
+            source = self.source * 4
+            result = formatter.format_range(source, 1, source.count('\n'))
+            self.assertGreater(len(result.edits), 100)
+
+            for checkpoint in formatter.checkpoints:
+                pipeline, collector = checkpoint.state
+                self.assertListEqual(collector.edits, [])
+                self.assertListEqual([error for stage in pipeline.stages for error in stage.errors], [])
+        finally:
+            RangeFormatter.CHECKPOINT_LINES = 200
+
+    def test_common_prefix_length(self):
+        self.assertEqual(common_prefix_length('abcdef', 'abcxef', block=2), 3)
+        self.assertEqual(common_prefix_length('abc', 'abcdef'), 3)
+
+    def test_invalid_range(self):
+        self.assertRaises(ValueError, lambda: Formatter.format_range(self.source, 5, 4, self.properties))
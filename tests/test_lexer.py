@@ -0,0 +1,92 @@
+import os
+from unittest import TestCase
+
+from lexer.lexer import Lexer, RegexLexer, LineIndex, Position
+from lexer.token import *
+from util.util import SourceFile
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestRegexLexer(TestCase):
+
+    def assertSameTokens(self, source):
+        char_lexer = Lexer.create(source, 'char')
+        regex_lexer = Lexer.create(source, 'regex')
+
+        expected = [(type(token), token.value, token.position) for token in char_lexer.tokens]
+        actual = [(type(token), token.value, token.position) for token in regex_lexer.tokens]
+
+        self.assertListEqual(expected, actual)
+        self.assertListEqual([str(e) for e in char_lexer.errors], [str(e) for e in regex_lexer.errors])
+
+    def test_engines(self):
+        self.assertIs(type(Lexer.create('', 'char')), Lexer)
+        self.assertIs(type(Lexer.create('')), RegexLexer)
+
+    def test_same_tokens_as_char_lexer(self):
+        self.assertSameTokens(SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all())
+
+    def test_same_tokens_on_edge_cases(self):
+        sources = (
+            'a...b..c.5 x.y 1.e3 .٣',
+            '"esc \\n \\07 \\q" \'\\\'\' "unterminated\n next',
+            '0 07 08 0x1F 0x1.8p3 0b11 1_000L 1__0 1_ 12l 0;',
+            '/* multi\n line */ x /*/ y */ /* unterminated',
+            'a // comment at the end',
+            '$x _y #z ²2 café >>>= -> ::',
+        )
+
+        for source in sources:
+            with self.subTest(source=source):
+                self.assertSameTokens(source)
+
+    def test_keyword_types(self):
+        tokens = list(Lexer.get_tokens('public int x class'))
+
+        self.assertListEqual([type(token) for token in tokens],
+                             [Modifier, Whitespace, BasicType, Whitespace, Identifier, Whitespace, Keyword])
+
+    def test_codes(self):
+        tokens = list(Lexer.get_tokens('if (a >= b) x++;\n'))
+
+        self.assertListEqual([token.code for token in tokens], [CODES.get(token.value, 0) for token in tokens])
+        self.assertEqual(len(set(CODES.values())), len(CODES))
+        self.assertNotIn(0, CODES.values())
+
+        for value in set(Operator.VALUES + Operator.INFIX):
+            operator = Operator(value)
+            self.assertEqual(operator.is_infix(), value in Operator.INFIX)
+            self.assertEqual(operator.is_prefix(), value in Operator.PREFIX)
+            self.assertEqual(operator.is_postfix(), value in Operator.POSTFIX)
+            self.assertEqual(operator.is_assignment(), value in Operator.ASSIGNMENT)
+        self.assertFalse(Operator('?').is_infix())
+
+
+class TestLineIndex(TestCase):
+
+    def test_lookups(self):
+        lines = LineIndex('ab\n\ncd\ne')
+
+        self.assertEqual(len(lines), 4)
+        self.assertListEqual([lines.line(offset) for offset in range(9)], [1, 1, 1, 2, 3, 3, 3, 4, 4])
+        self.assertEqual(lines.position(5), Position(3, 2))
+        self.assertListEqual([lines.start(line) for line in range(1, 6)], [0, 3, 4, 7, 8])
+        self.assertEqual(lines.end(3), 7)
+        self.assertListEqual([lines.text(line) for line in range(1, 5)], ['ab', '', 'cd', 'e'])
+        self.assertEqual(lines.newlines(1, 7), 3)
+        self.assertEqual(lines.newlines(4, 6), 0)
+
+    def test_token_positions(self):
+        source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+        lexer = Lexer.create(source)
+
+        for token, start, end in lexer.spans:
+            if type(token) is not LineBreak:
+                self.assertEqual(lexer.lines.line(start), token.position.line)
+
+    def test_error_context(self):
+        lexer = Lexer.create('int a;\nint # b;\nc')
+        list(lexer.tokens)
+
+        self.assertEqual(str(lexer.errors[0]), 'Could not process token at "#", line 2: int # b;')
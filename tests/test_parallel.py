@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from benchmarks.corpus import CorpusGenerator
+from formatter import vectorized
+from formatter.formatter import Formatter
+from formatter.parallel import ParallelFormatter, _guess_and_format
+from util.util import Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class NoContextFormatter(ParallelFormatter):
+    # Guesses that every chunk starts like a source, which is wrong inside a class.
+
+    def context(self, source, lines, cut):
+        return []
+
+
+class TestParallelFormatter(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+        with open(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')) as file:
+            sample = file.read()
+
+        header = sample.index('{') + 1
+        self.source = sample[:header] + sample[header:sample.rindex('}')] * 8 + '}\n' + sample
+
+    def assertSameAsSerial(self, formatter, source):
+        expected = Formatter.format(source, self.properties)
+        result = formatter.format(source)
+
+        self.assertEqual(result.code, expected.code)
+        self.assertListEqual(result.errors, expected.errors)
+
+    def test_same_as_serial(self):
+        with ParallelFormatter(self.properties, jobs=2, threshold=4096) as formatter:
+            self.assertGreater(len(formatter.split(self.source)), 2)
+            self.assertSameAsSerial(formatter, self.source)
+
+    def test_wrong_guess_is_formatted_again(self):
+        with ThreadPoolExecutor(2) as executor:
+            formatter = NoContextFormatter(self.properties, executor, jobs=2, threshold=4096)
+            self.assertSameAsSerial(formatter, self.source)
+
+    def test_malformed_source(self):
+        source = self.source.replace('}', '', 3).replace('(', '{', 5) + '/* unterminated\n'
+        with ThreadPoolExecutor(2) as executor:
+            self.assertSameAsSerial(ParallelFormatter(self.properties, executor, jobs=2, threshold=4096), source)
+
+    def test_small_source_is_not_split(self):
+        formatter = ParallelFormatter(self.properties, jobs=2)
+
+        self.assertEqual(len(formatter.split(self.source)), 1)
+        self.assertSameAsSerial(formatter, self.source)
+        self.assertIsNone(formatter.executor)
+
+    def test_single_job_is_serial(self):
+        formatter = ParallelFormatter(self.properties, jobs=1, threshold=4096)
+
+        self.assertEqual(len(formatter.split(self.source)), 1)
+        self.assertSameAsSerial(formatter, self.source)
+        self.assertIsNone(formatter.executor)
+
+    def test_no_chunk_is_formatted_again(self):
+        source = CorpusGenerator(0).generate(200000)
+        enabled = vectorized.ENABLED
+        try:
+            for vectorized.ENABLED in (False, True) if vectorized.numpy is not None else (False,):
+                with self.subTest(numpy=vectorized.ENABLED), ThreadPoolExecutor(2) as executor:
+                    formatter = ParallelFormatter(self.properties, executor, jobs=2, threshold=32768)
+                    chunks = formatter.split(source)
+                    results = [_guess_and_format(self.properties, chunk, carried)
+                               for chunk, carried in zip(chunks, formatter.carried(chunks))]
+
+                    self.assertGreater(len(chunks), 2)
+                    for previous, result in zip(results, results[1:]):
+                        self.assertEqual(result.guess, previous.state)
+                    self.assertSameAsSerial(formatter, source)
+        finally:
+            vectorized.ENABLED = enabled
+
+    def test_cuts(self):
+        source = 'class A {\n  void f() {\n    g("}");\n  }\n  // }\n  int a;\n}\nclass B {\n}\n'
+        formatter = ParallelFormatter(self.properties)
+        formatter.CONTEXT_SIZE = 24
+        cuts = list(formatter.cuts(source, 1))
+
+        self.assertListEqual([cut.offset for cut in cuts], [source.index('  // }'), source.index('class B')])
+        self.assertListEqual([cut.start for cut in cuts], [source.index('  void'), source.index('  // }')])
+        self.assertListEqual([cut.openers for cut in cuts], [[source.index('{')], [source.index('{')]])
@@ -0,0 +1,62 @@
+import os
+from unittest import TestCase
+
+from formatter.formatter import Formatter
+from formatter.pipeline import FusedPipeline
+from formatter.stages import STAGES
+from formatter.util import TokenUtils, LINE_BREAK
+from lexer.lexer import Lexer, SPACES
+from lexer.token import Whitespace, LineBreak
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestFusedPipeline(TestCase):
+
+    def setUp(self):
+        self.source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def assertSameAsLegacy(self, source, p):
+        legacy = Formatter.format(source, p, fused=False)
+        fused = Formatter.format(source, p, fused=True)
+
+        self.assertEqual(legacy.code, fused.code)
+        self.assertListEqual(legacy.errors, fused.errors)
+
+    def test_same_output_as_legacy(self):
+        self.assertSameAsLegacy(self.source, self.properties)
+
+    def test_same_output_with_small_batches(self):
+        batch_size = FusedPipeline.BATCH_SIZE
+        try:
+            for FusedPipeline.BATCH_SIZE in (1, 3, 16):
+                self.assertSameAsLegacy(self.source, self.properties)
+        finally:
+            FusedPipeline.BATCH_SIZE = batch_size
+
+    def test_same_output_with_stages_disabled(self):
+        for option in ('format_curly_braces', 'split_long_lines', 'clear_line_breaks_in_signatures'):
+            self.properties = self.properties.replace(**{option: False})
+            self.assertSameAsLegacy(self.source, self.properties)
+
+    def test_errors_are_reported_in_stage_order(self):
+        result = Formatter.format('class A {{ int a;; }', self.properties)
+
+        self.assertListEqual(result.errors, ['Double semicolon at Position(line=1, column=17).',
+                                             'Expected closing bracket at the end.'])
+
+    def test_inserted_tokens_are_shared(self):
+        tokens = list(Lexer.get_tokens('int  a=1;\n    if(a){b();}\n'))
+        original = [(token.value, token.position) for token in tokens]
+
+        output = list(FusedPipeline(stage(self.properties, []) for stage in STAGES).run(tokens))
+
+        self.assertListEqual([(token.value, token.position) for token in tokens], original)
+        self.assertIs(tokens[1].value, SPACES[2])
+        for token in output:
+            if token.position is None and type(token) is Whitespace:
+                self.assertIs(token, TokenUtils.whitespace(len(token.value)))
+            elif token.position is None and type(token) is LineBreak:
+                self.assertIs(token, LINE_BREAK)
@@ -0,0 +1,51 @@
+import os
+from unittest import TestCase
+
+from formatter.formatter import Formatter
+from formatter.profile import Profiler, StageStats
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestProfile(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+        self.source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+
+    def test_observer_does_not_change_result(self):
+        for fused in (True, False):
+            stats = []
+            result = Formatter.format(self.source, self.properties, fused, observer=stats.append)
+            expected = Formatter.format(self.source, self.properties, fused)
+
+            self.assertEqual(expected.code, result.code)
+            self.assertListEqual(expected.errors, result.errors)
+            self.assertEqual(stats[0].name, 'Lexer')
+            self.assertEqual(stats[-1].name, 'RemoveRedundantLineBreaks')
+
+    def test_fused_and_legacy_counts_match(self):
+        fused = Profiler()
+        legacy = Profiler()
+        Formatter.format(self.source, self.properties, True, observer=fused)
+        Formatter.format(self.source, self.properties, False, observer=legacy)
+
+        def counts(profiler):
+            return [(s.name, s.tokens_in, s.tokens_out, s.inserts, s.removes, s.replaces)
+                    for s in profiler.stages.values()]
+
+        self.assertListEqual(counts(fused), counts(legacy))
+        for stats in fused.stages.values():
+            if stats.name != 'Lexer':
+                self.assertEqual(stats.tokens_out - stats.tokens_in, stats.inserts - stats.removes)
+
+    def test_profiler_sums_files(self):
+        profiler = Profiler()
+        Formatter.format(self.source, self.properties, observer=profiler)
+        single = profiler.stages['Lexer'].tokens_out
+
+        Formatter.format(self.source, self.properties, observer=profiler)
+        self.assertEqual(profiler.stages['Lexer'].tokens_out, 2 * single)
+        self.assertIn('SplitLongLines', profiler.table())
+        self.assertListEqual(sorted(profiler.as_list()[0]), sorted(('name',) + StageStats.FIELDS))
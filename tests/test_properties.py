@@ -0,0 +1,73 @@
+import copy
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+from formatter.formatter import CompiledFormatter
+from util.util import Properties, SCHEMA_PATH
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestProperties(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self, text):
+        path = os.path.join(self.directory.name, 'custom.properties')
+        with open(path, 'w') as file:
+            file.write(text)
+        return Properties(path)
+
+    def test_values_are_typed(self):
+        self.assertEqual(self.properties.indent, 10)
+        self.assertIs(self.properties.preserve_comment_indent, False)
+        self.assertListEqual(list(self.properties.map), list(Properties.SCHEMA))
+
+    def test_defaults_are_filled_in(self):
+        p = self.load('# only the indent\nindent:int=8\n')
+
+        self.assertEqual(p.indent, 8)
+        self.assertEqual(p.split_indent, Properties(SCHEMA_PATH).split_indent)
+
+    def test_untyped_values_are_converted(self):
+        self.assertEqual(self.load('indent=3\n').indent, 3)
+
+    def test_invalid_properties(self):
+        for text in ('indnet:int=4\n', 'indent:bool=true\n', 'indent:int=four\n',
+                     'clear_line_breaks_in_signatures=yes\n'):
+            with self.assertRaises(ValueError):
+                self.load(text)
+
+        with self.assertRaises(ValueError):
+            self.properties.replace(indent='4')
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            getattr(self.properties, 'indnet')
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.properties.indent = 4
+
+        p = self.properties.replace(indent=4)
+        self.assertEqual(p.indent, 4)
+        self.assertEqual(self.properties.indent, 10)
+
+    def test_hashable(self):
+        same = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+        self.assertEqual(self.properties, same)
+        self.assertEqual(hash(self.properties), hash(same))
+        self.assertNotEqual(self.properties, self.properties.replace(indent=4))
+        self.assertIs(CompiledFormatter.compile(self.properties), CompiledFormatter.compile(same))
+
+    def test_copy_and_pickle(self):
+        self.assertEqual(copy.deepcopy(self.properties), self.properties)
+        self.assertEqual(pickle.loads(pickle.dumps(self.properties)), self.properties)
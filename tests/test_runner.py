@@ -0,0 +1,79 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from formatter.runner import Runner
+from util.util import SourceFile, Helpers
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestRunner(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.properties = os.path.join(TESTS_DIR, 'test.properties')
+
+        os.makedirs(os.path.join(self.root, 'a', 'b'))
+        self.write('a/Formatted.java', 'int a = 1;\n')
+        self.write('a/b/Messy.java', 'int   a=1;\n')
+        self.write('a/Broken.java', 'int a;')
+        self.write('a/notes.txt', 'not java')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        SourceFile(os.path.join(self.root, name)).replace_all(text)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def test_collect_files(self):
+        expected = [self.path('a/Broken.java'), self.path('a/Formatted.java'), self.path('a/b/Messy.java')]
+
+        self.assertListEqual(Helpers.collect_files([self.root]), expected)
+        self.assertListEqual(Helpers.collect_files([os.path.join(self.root, '**', '*')]), expected)
+        self.assertListEqual(Helpers.collect_files([self.path('a/notes.txt')]), [self.path('a/notes.txt')])
+
+    def test_run_in_pool(self):
+        paths = Helpers.collect_files([self.root])
+        os.utime(self.path('a/Formatted.java'), (0, 0))
+
+        results = {result.path: result for result in Runner(self.properties, jobs=2).run(paths)}
+
+        self.assertTrue(results[self.path('a/b/Messy.java')].changed)
+        self.assertEqual(SourceFile(self.path('a/b/Messy.java')).read_all(), 'int a = 1;\n')
+
+        self.assertFalse(results[self.path('a/Formatted.java')].changed)
+        self.assertEqual(os.stat(self.path('a/Formatted.java')).st_mtime, 0)
+
+        self.assertIsNotNone(results[self.path('a/Broken.java')].failure)
+        self.assertIn('1 failed', Runner.summary(list(results.values())))
+
+    def test_stream_keeps_crlf_file(self):
+        path = self.path('a/Formatted.java')
+        with open(path, 'wb') as file:
+            file.write(b'int a = 1;\r\nint b = 2;\r\n')
+        os.utime(path, (0, 0))
+
+        for stream in (False, True):
+            result, = Runner(self.properties, stream=stream).run([path])
+
+            self.assertFalse(result.changed)
+            self.assertEqual(os.stat(path).st_mtime, 0)
+
+    def test_check(self):
+        paths = Helpers.collect_files([self.root])
+
+        results = {result.path: result for result in Runner(self.properties, jobs=2, check=True).run(paths)}
+
+        messy = results[self.path('a/b/Messy.java')]
+        self.assertTrue(messy.changed)
+        self.assertEqual(messy.difference, (1, 5, 'int   a=1;', 'int a = 1;'))
+        self.assertEqual(SourceFile(self.path('a/b/Messy.java')).read_all(), 'int   a=1;\n')
+
+        self.assertFalse(results[self.path('a/Formatted.java')].changed)
+        self.assertIsNotNone(results[self.path('a/Broken.java')].failure)
+        self.assertIn('1 not formatted, 1 failed', Helpers.check_summary(list(results.values())))
@@ -0,0 +1,47 @@
+import random
+from unittest import TestCase
+
+from formatter.sequence import TokenSequence
+from formatter.util import TokenUtils
+from lexer.token import *
+
+
+class TestTokenSequence(TestCase):
+
+    def test_matches_list_operations(self):
+        rng = random.Random(0)
+        expected = list(range(20))
+        sequence = TokenSequence(expected)
+
+        for _ in range(2000):
+            action = rng.random()
+            if action < 0.4:
+                i = rng.randint(-len(expected) - 2, len(expected) + 2)
+                expected.insert(i, -i)
+                sequence.insert(i, -i)
+            elif action < 0.7 and expected:
+                i = rng.randrange(len(expected))
+                self.assertEqual(expected.pop(i), sequence.pop(i))
+            elif expected:
+                i = rng.randrange(len(expected))
+                expected[i] = sequence[i] = rng.random()
+
+            self.assertEqual(len(expected), len(sequence))
+
+        self.assertListEqual(expected, list(sequence))
+
+    def test_index_out_of_range(self):
+        sequence = TokenSequence([Keyword('a')])
+
+        self.assertRaises(IndexError, lambda: sequence[1])
+        self.assertRaises(IndexError, lambda: sequence.pop(1))
+        self.assertRaises(IndexError, lambda: TokenSequence().pop())
+
+    def test_token_utils(self):
+        tokens = TokenSequence([LineBreak('\n'), Whitespace(' '), Keyword('a')])
+
+        TokenUtils.add_or_replace_before(tokens, 2, Whitespace(''), LineBreak('\n'))
+        TokenUtils.add_or_replace_after(tokens, 3, LineBreak('\n'))
+        TokenUtils.remove_before_if_exists(tokens, 1, LineBreak)
+
+        self.assertEqual(tokens, [Whitespace(''), LineBreak('\n'), Keyword('a'), LineBreak('\n')])
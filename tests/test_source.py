@@ -0,0 +1,126 @@
+import codecs
+import io
+import os
+import stat
+import tempfile
+from unittest import TestCase, skipUnless
+
+from formatter.formatter import Formatter
+from util.util import SourceFile, WriteBatch, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestSourceFile(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'A.java')
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_bytes(self, data):
+        with open(self.path, 'wb') as file:
+            file.write(data)
+
+    def read_bytes(self):
+        with open(self.path, 'rb') as file:
+            return file.read()
+
+    def test_encodings_round_trip(self):
+        text = 'String s = "été";\n'
+        for encoding, data in (('utf-8', text.encode('utf-8')),
+                               ('utf-8-sig', codecs.BOM_UTF8 + text.encode('utf-8')),
+                               ('utf-16', text.encode('utf-16')),
+                               ('latin-1', text.encode('latin-1'))):
+            self.write_bytes(data)
+            file = SourceFile(self.path)
+
+            self.assertEqual(file.read_all(), text)
+            self.assertEqual(file.encoding, encoding)
+
+            file.replace_all(text)
+            self.assertEqual(self.read_bytes(), data)
+
+    def test_memory_mapped(self):
+        text = 'int a = 1;\r\n' * (SourceFile.MMAP_THRESHOLD // 8)
+        self.write_bytes(text.encode('utf-8'))
+
+        self.assertEqual(SourceFile(self.path).read_all(), text.replace('\r\n', '\n'))
+        with SourceFile(self.path).mapped() as data:
+            self.assertNotIsInstance(data, bytes)
+
+    def test_stream_from_mapped_file(self):
+        source = 'int  a=1;\r\n' * (SourceFile.MMAP_THRESHOLD // 8)
+        self.write_bytes(source.encode('utf-16'))
+
+        file = SourceFile(self.path)
+        writer = io.StringIO()
+        with file.reader() as reader:
+            Formatter.format_stream(reader, writer, self.properties, chunk_size=4096, encoding=file.encoding)
+
+        self.assertEqual(file.encoding, 'utf-16')
+        self.assertEqual(writer.getvalue(), Formatter.format(source.replace('\r\n', '\n'), self.properties).code)
+
+    def test_stream_latin_1(self):
+        source = 'int  a=1;\n' * (SourceFile.MMAP_THRESHOLD // 8) + 'String  s="été";\n'
+        self.write_bytes(source.encode('latin-1'))
+
+        file = SourceFile(self.path)
+        writer = io.StringIO()
+        with file.reader() as reader:
+            Formatter.format_stream(reader, writer, self.properties, encoding=file.encoding)
+
+        self.assertEqual(file.encoding, 'latin-1')
+        self.assertEqual(writer.getvalue(), Formatter.format(source, self.properties).code)
+
+    def test_replace_keeps_permissions(self):
+        self.write_bytes(b'int a;\n')
+        os.chmod(self.path, 0o640)
+
+        SourceFile(self.path).replace_all('int b;\n', fsync=True)
+
+        self.assertEqual(self.read_bytes(), b'int b;\n')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertListEqual(os.listdir(self.directory.name), ['A.java'])
+
+    @skipUnless(hasattr(os, 'symlink'), 'Symbolic links are not supported')
+    def test_replace_through_symlink(self):
+        self.write_bytes(b'int   a=1;\n')
+        os.chmod(self.path, 0o640)
+        link = os.path.join(self.directory.name, 'Link.java')
+        os.symlink(self.path, link)
+
+        SourceFile(link).replace_all('int a = 1;\n')
+        with WriteBatch(fsync=True) as batch:
+            batch.write(SourceFile(link), 'int b = 1;\n')
+
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(self.read_bytes(), b'int b = 1;\n')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertListEqual(sorted(os.listdir(self.directory.name)), ['A.java', 'Link.java'])
+
+    def test_failed_write_leaves_file(self):
+        self.write_bytes(b'int a;\n')
+
+        with self.assertRaises(UnicodeEncodeError):
+            SourceFile(self.path, 'ascii').replace_all('String s = "é";\n')
+
+        self.assertEqual(self.read_bytes(), b'int a;\n')
+        self.assertListEqual(os.listdir(self.directory.name), ['A.java'])
+
+    def test_write_batch(self):
+        paths = [os.path.join(self.directory.name, 'F{}.java'.format(i)) for i in range(3)]
+        for path in paths:
+            SourceFile(path).replace_all('old\n')
+
+        with WriteBatch(fsync=True) as batch:
+            for path in paths:
+                batch.write(SourceFile(path), 'new\n')
+            # Nothing is replaced before the batch is synced.
+            self.assertEqual(SourceFile(paths[0]).read_all(), 'old\n')
+
+        self.assertListEqual([SourceFile(path).read_all() for path in paths], ['new\n'] * 3)
+        self.assertListEqual(sorted(os.listdir(self.directory.name)), ['F0.java', 'F1.java', 'F2.java'])
@@ -0,0 +1,53 @@
+import os
+from unittest import TestCase
+
+from formatter.formatter import Formatter
+from formatter.pipeline import FusedPipeline
+from util.util import Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestSplitLongLines(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+        self.properties = self.properties.replace(preferred_line_length=40, split_indent=4)
+
+    def format(self, source):
+        return Formatter.format(source, self.properties).code
+
+    def test_lines_fit(self):
+        source = 'foo(' + ', '.join('argument{}'.format(i) for i in range(30)) + ');\n'
+        lines = self.format(source).split('\n')
+
+        self.assertGreater(len(lines), 5)
+        self.assertTrue(all(len(line) <= 40 for line in lines))
+        self.assertEqual(''.join(lines).replace(' ', ''), source.replace(' ', '').strip())
+
+    def test_split_at_last_point_that_fits(self):
+        self.assertEqual(self.format('builder().first(1).second(2).third(3).fourth(4);\n'),
+                         'builder().first(1).second(2).third(3)\n    .fourth(4);\n')
+
+    def test_align_after_parenthesis(self):
+        self.assertEqual(self.format('call(alpha, beta, gamma, delta, epsilon);\n'),
+                         'call(alpha, beta, gamma, delta,\n     epsilon);\n')
+
+    def test_long_token_without_split_point(self):
+        source = 'String s = "{}";\n'.format('x' * 60)
+        self.assertEqual(self.format(source), source)
+
+    def test_imports_are_not_split(self):
+        source = 'import com.example.very.long.package.name.of.some.Library;\n'
+        self.assertEqual(self.format(source), source)
+
+    def test_same_output_with_small_batches(self):
+        source = 'class A {\n    void f() {\n        ' + 'a.b(c, d).'.join('e' for i in range(40)) + ';\n    }\n}\n'
+        legacy = Formatter.format(source, self.properties, fused=False).code
+
+        batch_size = FusedPipeline.BATCH_SIZE
+        try:
+            for FusedPipeline.BATCH_SIZE in (1, 5, 64):
+                self.assertEqual(legacy, self.format(source))
+        finally:
+            FusedPipeline.BATCH_SIZE = batch_size
@@ -0,0 +1,41 @@
+import io
+import os
+from unittest import TestCase
+
+from formatter.formatter import Formatter
+from lexer.lexer import Lexer
+from lexer.stream import StreamLexer
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestStream(TestCase):
+
+    def setUp(self):
+        self.source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+    def test_stream_lexer_matches_lexer(self):
+        expected = list(Lexer.get_tokens(self.source))
+
+        for chunk_size in (1, 7, 64, 4096):
+            with self.subTest(chunk_size=chunk_size):
+                lexer = StreamLexer(io.StringIO(self.source), chunk_size=chunk_size)
+                self.assertListEqual(list(lexer.tokens), expected)
+
+    def test_stream_lexer_carries_unterminated_tokens(self):
+        source = 'a = "multi\nline";\n/* long\n\ncomment */ b\n// end'
+        lexer = StreamLexer(io.BytesIO(source.encode()), chunk_size=3)
+
+        self.assertListEqual(list(lexer.tokens), list(Lexer.get_tokens(source)))
+
+    def test_format_stream(self):
+        expected = Formatter.format(self.source, self.properties)
+        writer = io.StringIO()
+
+        result = Formatter.format_stream(io.StringIO(self.source), writer, self.properties, chunk_size=100)
+
+        self.assertEqual(writer.getvalue(), expected.code)
+        self.assertListEqual(result.errors, expected.errors)
+        self.assertIsNone(result.code)
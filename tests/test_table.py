@@ -0,0 +1,69 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from formatter.formatter import Formatter
+from lexer.lexer import Lexer
+from lexer.table import TokenTable
+from lexer.token import *
+from util.util import SourceFile, Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class TestTokenTable(TestCase):
+
+    def setUp(self):
+        self.source = SourceFile(os.path.join(TESTS_DIR, 'testdata', 'Sample.java')).read_all()
+
+    def test_tokens_match_lexer(self):
+        table = TokenTable.from_source(self.source)
+
+        self.assertEqual(len(table), len(list(Lexer.get_tokens(self.source))))
+        self.assertListEqual(list(table), list(Lexer.get_tokens(self.source)))
+
+    def test_view(self):
+        table = TokenTable.from_source('int  x;')
+        view = table.view(2)
+
+        self.assertIs(view.type, Identifier)
+        self.assertEqual((view.start, view.end, view.value), (5, 6, 'x'))
+        self.assertEqual(view.position, (1, 6))
+        self.assertRaises(IndexError, lambda: table.view(4))
+
+    def test_tokens_have_no_dict(self):
+        self.assertFalse(hasattr(Keyword('if'), '__dict__'))
+        self.assertEqual(repr(Keyword('if')), 'Keyword[value=if, position=None]')
+
+    def test_format_table(self):
+        p = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+
+        self.assertEqual(Formatter.format_tokens(TokenTable.from_source(self.source), p).code,
+                         Formatter.format(self.source, p).code)
+
+    def test_binary_round_trip(self):
+        table = TokenTable.from_source(self.source)
+        loaded = TokenTable.from_buffer(self.source, table.to_bytes())
+
+        self.assertListEqual(list(loaded), list(table))
+        self.assertEqual(loaded.to_bytes(), table.to_bytes())
+        self.assertEqual(loaded.nbytes, table.nbytes)
+        self.assertListEqual(list(TokenTable.from_buffer('', TokenTable('').to_bytes())), [])
+
+    def test_load_memory_mapped(self):
+        table = TokenTable.from_source(self.source)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'Sample.tokens')
+            with open(path, 'wb') as file:
+                file.write(table.to_bytes())
+
+            loaded = TokenTable.load(self.source, path)
+            self.assertListEqual(list(loaded), list(table))
+            self.assertEqual(loaded.view(5).value, table.view(5).value)
+
+    def test_invalid_buffer(self):
+        data = TokenTable.from_source('int a;').to_bytes()
+
+        self.assertRaises(ValueError, TokenTable.from_buffer, 'int a;', data[:-1])
+        self.assertRaises(ValueError, TokenTable.from_buffer, 'int a;', b'JTOK')
+        self.assertRaises(ValueError, TokenTable.from_buffer, 'int a;', b'XTOK' + data[4:])
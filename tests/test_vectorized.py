@@ -0,0 +1,49 @@
+import os
+from unittest import TestCase, skipIf
+
+from formatter import vectorized
+from formatter.formatter import Formatter
+from formatter.pipeline import FusedPipeline
+from lexer.lexer import Lexer
+from util.util import Properties
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+@skipIf(vectorized.numpy is None, 'NumPy is not installed')
+class TestVectorized(TestCase):
+
+    def setUp(self):
+        self.properties = Properties(os.path.join(TESTS_DIR, 'test.properties'))
+        self.enabled = vectorized.ENABLED
+        self.min_window = vectorized.MIN_WINDOW
+        self.batch_size = FusedPipeline.BATCH_SIZE
+
+    def tearDown(self):
+        vectorized.ENABLED = self.enabled
+        vectorized.MIN_WINDOW = self.min_window
+        FusedPipeline.BATCH_SIZE = self.batch_size
+
+    def format(self, source, enabled, fused=True):
+        vectorized.ENABLED = enabled
+        result = Formatter.format(source, self.properties, fused=fused)
+        return result.code, result.errors
+
+    def test_same_output(self):
+        source = 'class A {\n' + ''.join('    int  a{0} =  {0};\n\n \n\n  \n\n'.format(i) for i in range(100)) + '}\n'
+        expected = self.format(source, False)
+
+        for vectorized.MIN_WINDOW in (1, 3, 256):
+            for FusedPipeline.BATCH_SIZE in (1, 7, 512):
+                for fused in (True, False):
+                    self.assertEqual(expected, self.format(source, True, fused))
+
+    def test_long_whitespace(self):
+        tokens = list(Lexer.get_tokens('int  a =\tb;    c'))
+        self.assertListEqual(vectorized.long_whitespace(tokens), [1, 8])
+
+    def test_redundant_line_breaks(self):
+        tokens = list(Lexer.get_tokens('a\n\n \n\nb\n'))
+        self.assertEqual(vectorized.redundant_line_breaks(tokens, 0), ([4, 5], 1))
+        self.assertEqual(vectorized.redundant_line_breaks(tokens[1:3], 2), ([0, 1], 2))
+        self.assertEqual(vectorized.redundant_line_breaks([], 2), ([], 2))
@@ -0,0 +1,49 @@
+package com.example.demo;
+
+import java.util.List;
+import java.util.Map;
+
+/**
+ * Sample class used to exercise the formatter.
+ *   Indented comment line.
+ */
+@SuppressWarnings("unchecked")
+public   class Sample<T extends Comparable<T>>   implements Runnable {
+    private static final int   MAX =  0x1F ;
+    private final Map< String , List<T> > cache = new java.util.HashMap<>();
+    protected double ratio = 1.5e-3d;;
+    long big = 1_000_000L;
+
+
+
+    public
+    static <K, V> Map<K, V> build(K key,V value)
+    {
+        // single line comment
+        Map<K,V> map=new java.util.HashMap<>(  );
+        map.put( key , value );
+        return map;
+    }
+
+    @Override
+    public void run() {
+        for (int i=0;i<MAX;i++) {
+            if(i%2==0){System.out.println("even \"" + i + '\n');}
+            else if (i % 3 == 0) { continue; }
+            else { i++ ; }
+        }
+        switch (MAX) {
+            case 1 : System.out.println("one"); break;
+            default : break;
+        }
+        while(true){ break; }
+        try { run(); } catch (RuntimeException e) { throw e; } finally { ratio = -ratio; }
+        String s = new StringBuilder().append("aaaaaaaaaaaaaaaaaaaaaa").append("bbbbbbbbbbbbbbbbbbbbbbbbbbb").append("ccccccccccccccccccccccccccccc").append("ddddd").toString();
+        call(argumentNumberOne, argumentNumberTwo, argumentNumberThree, argumentNumberFour, argumentNumberFive, six);
+        Runnable r = () -> { System.out.println(this::toString); };
+        int[] arr = {1, 2, 3};
+        boolean b = !(arr.length >= 3) && arr[0] != 1 || null == s;
+        /* block
+           comment */ int after = 1; // trailing
+    }
+}
@@ -1,6 +1,13 @@
+import codecs
+import glob
+import itertools
+import mmap
 import os
-from collections import namedtuple
-from typing import Dict, List
+import stat
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
 
 
 class Helpers:
@@ -9,25 +16,242 @@ class Helpers:
     def get_file_extension(file_path):
         return os.path.splitext(file_path)[1]
 
+    @staticmethod
+    def collect_files(paths: List[str], extension='.java') -> List[str]:
+        # Expands directories and glob patterns, files named explicitly are kept as they are.
+        files = []
+        for path in paths:
+            if glob.has_magic(path):
+                matches = sorted(glob.glob(path, recursive=True))
+            else:
+                matches = [path]
+
+            for match in matches:
+                if os.path.isdir(match):
+                    for root, dirs, names in os.walk(match):
+                        dirs.sort()
+                        files.extend(os.path.join(root, name) for name in sorted(names)
+                                     if Helpers.get_file_extension(name) == extension)
+                elif match == path or Helpers.get_file_extension(match) == extension:
+                    files.append(match)
+
+        return list(dict.fromkeys(files))
+
+    @staticmethod
+    def summary(results: List['FileResult']) -> str:
+        lines = []
+        for result in results:
+            if result.failure is not None:
+                lines.append('{}: failed, {}'.format(result.path, result.failure))
+            for error in result.errors:
+                lines.append('{}: {}'.format(result.path, error))
+
+        changed = sum(1 for result in results if result.changed)
+        failed = sum(1 for result in results if result.failure is not None)
+        lines.append('{} files processed, {} reformatted, {} failed.'.format(len(results), changed, failed))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def check_summary(results: List['FileResult']) -> str:
+        lines = []
+        for result in results:
+            if result.failure is not None:
+                lines.append('{}: failed, {}'.format(result.path, result.failure))
+            elif result.difference is not None:
+                d = result.difference
+                lines.append('{}:{}:{}: not formatted'.format(result.path, d.line, d.column))
+                lines.append('-' + d.original)
+                lines.append('+' + d.formatted)
+
+        unformatted = sum(1 for result in results if result.changed)
+        failed = sum(1 for result in results if result.failure is not None)
+        lines.append('{} files checked, {} not formatted, {} failed.'.format(len(results), unformatted, failed))
+        return '\n'.join(lines)
+
 
 class Representable:
+    __slots__ = ()
 
     def __repr__(self) -> str:
-        return '{}[{}]'.format(type(self).__name__, ', '.join('%s=%s' % item for item in vars(self).items()))
+        return '{}[{}]'.format(type(self).__name__, ', '.join('%s=%s' % item for item in self._fields()))
+
+    def _fields(self):
+        if hasattr(self, '__dict__'):
+            return vars(self).items()
+        return ((name, getattr(self, name)) for cls in reversed(type(self).__mro__)
+                for name in getattr(cls, '__slots__', ()))
+
+
+# Suffixes of temporary files, unique within the process.
+_temporary_names = itertools.count()
 
 
 class SourceFile(Representable):
+    # Files from this size on are decoded straight from a memory map instead of being read first.
+    MMAP_THRESHOLD = 1 << 16
+    WRITE_BUFFER_SIZE = 1 << 20
+    VALIDATE_CHUNK_SIZE = 1 << 20
+
+    BOMS = ((codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'), (codecs.BOM_UTF8, 'utf-8-sig'),
+            (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, encoding: Optional[str] = None):
         self.file_path = file_path
+        # Detected by read_all() unless given, replace_all() writes with the same encoding.
+        self.encoding = encoding
 
     def read_all(self):
-        with open(self.file_path, 'r') as file:
-            return file.read()
+        with self.mapped() as data:
+            if self.encoding is not None:
+                text = str(data, self.encoding)
+            else:
+                # Decoded once, the detection only validates UTF-8 by decoding it.
+                encoding = SourceFile.detect_encoding(data, validate=False)
+                try:
+                    text = str(data, encoding)
+                except UnicodeDecodeError:
+                    if encoding != 'utf-8':
+                        raise
+                    encoding = 'latin-1'
+                    text = str(data, encoding)
+                self.encoding = encoding
+
+        # Same line breaks as a file read in text mode.
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    def same_text(self, path: str) -> bool:
+        # Whether the file at `path` holds the text of this one, both read in its encoding and with line breaks
+        # normalized like by read_all(), a chunk at a time.
+        encoding = self.encoding or 'utf-8'
+        with open(self.file_path, encoding=encoding) as file, open(path, encoding=encoding) as other:
+            while True:
+                chunk = file.read(SourceFile.VALIDATE_CHUNK_SIZE)
+                if chunk != other.read(SourceFile.VALIDATE_CHUNK_SIZE):
+                    return False
+                if not chunk:
+                    return True
+
+    @contextmanager
+    def mapped(self):
+        # Contents as a read-only buffer, memory mapped if the file is large enough.
+        with self._open() as (file, data):
+            yield file.read() if data is None else data
+
+    @contextmanager
+    def reader(self):
+        # Binary reader for Formatter.format_stream, a memory map if the file is large enough. If the
+        # encoding is not known yet, it is detected like by read_all(), UTF-8 validated chunk by chunk.
+        with self._open() as (file, data):
+            reader = file if data is None else data
+            if self.encoding is None:
+                self.encoding = SourceFile.detect_encoding(reader.read(4), validate=False)
+                reader.seek(0)
+                if self.encoding == 'utf-8' and not SourceFile.is_utf8(reader):
+                    self.encoding = 'latin-1'
+                reader.seek(0)
+            yield reader
+
+    @contextmanager
+    def _open(self):
+        with open(self.file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size < SourceFile.MMAP_THRESHOLD:
+                yield file, None
+                return
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield file, data
+
+    def replace_all(self, text, fsync: bool = False):
+        # The text goes to a temporary file that then replaces this one, a crash leaves either file whole.
+        # A symbolic link is followed, so that the file it points to is replaced rather than the link.
+        path = os.path.realpath(self.file_path)
+        temp_path = self.write_temporary(text)
+        if fsync:
+            SourceFile.sync(temp_path)
+        os.replace(temp_path, path)
+        if fsync:
+            SourceFile.sync_directory(os.path.dirname(path))
 
-    def replace_all(self, text):
-        with open(self.file_path, 'w') as file:
-            return file.write(text)
+    def write_temporary(self, text) -> str:
+        temp_path, writer = self.open_temporary()
+        try:
+            with writer:
+                writer.write(text)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path
+
+    def open_temporary(self):
+        # Temporary file next to this one, or to the file it links to, with its permissions. Returns its path and
+        # a text writer.
+        path = os.path.realpath(self.file_path)
+        directory, name = os.path.split(path)
+        while True:
+            temp_path = os.path.join(directory, '.{}.{}-{}.tmp'.format(name, os.getpid(), next(_temporary_names)))
+            try:
+                fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+                break
+            except FileExistsError:
+                continue
+
+        try:
+            if os.path.exists(path):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+            return temp_path, open(fd, 'w', encoding=self.encoding or 'utf-8',
+                                   buffering=SourceFile.WRITE_BUFFER_SIZE)
+        except BaseException:
+            os.close(fd)
+            os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def detect_encoding(data, validate: bool = True) -> str:
+        # A byte order mark decides, otherwise UTF-8 if the data is valid UTF-8 (or not validated) and
+        # Latin-1, which reads and writes any bytes unchanged, if not.
+        for bom, encoding in SourceFile.BOMS:
+            if data[:len(bom)] == bom:
+                return encoding
+
+        if validate:
+            try:
+                codecs.decode(data, 'utf-8')
+            except UnicodeDecodeError:
+                return 'latin-1'
+        return 'utf-8'
+
+    @staticmethod
+    def is_utf8(reader) -> bool:
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            while True:
+                data = reader.read(SourceFile.VALIDATE_CHUNK_SIZE)
+                decoder.decode(data, final=not data)
+                if not data:
+                    return True
+        except UnicodeDecodeError:
+            return False
+
+    @staticmethod
+    def sync(path: str):
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def sync_directory(path: str):
+        # Makes renames in the directory durable, not possible on every platform.
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
     def __eq__(self, o: object) -> bool:
         if isinstance(o, SourceFile):
@@ -38,19 +262,176 @@ class SourceFile(Representable):
         return hash(self.file_path)
 
 
+class WriteBatch:
+    # Replaces many files at once. Without fsync every file is replaced right away. With it, the temporary
+    # files of a batch are synced before any of them replaces its file, then every directory once, instead
+    # of a sync of the file and of its directory for every single file.
+
+    def __init__(self, fsync: bool = False):
+        self.fsync = fsync
+        self.pending = []
+
+    def write(self, file: SourceFile, text: str):
+        self.commit(file.write_temporary(text), file.file_path)
+
+    def commit(self, temp_path: str, path: str):
+        # Like SourceFile.replace_all, the file a symbolic link points to is replaced.
+        path = os.path.realpath(path)
+        if self.fsync:
+            self.pending.append((temp_path, path))
+        else:
+            os.replace(temp_path, path)
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        try:
+            for temp_path, path in pending:
+                SourceFile.sync(temp_path)
+        except BaseException:
+            for temp_path, path in pending:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+
+        directories = set()
+        for temp_path, path in pending:
+            os.replace(temp_path, path)
+            directories.add(os.path.dirname(path))
+        for directory in sorted(directories):
+            SourceFile.sync_directory(directory)
+
+    def __enter__(self) -> 'WriteBatch':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.properties')
+
+
+def _to_bool(s: str) -> bool:
+    value = s.lower()
+    if value not in ('true', 'false'):
+        raise ValueError('invalid bool value {!r}'.format(s))
+    return value == 'true'
+
+
+CONVERTERS = {
+    'int': int,
+    'float': float,
+    'bool': _to_bool,
+    'str': str,
+}
+
+
+def _read_properties(file_path: str, separator: str = '=', comment_char: str = '#',
+                     type_separator: str = ':') -> List[Tuple[str, Optional[str], str]]:
+    # Name, declared type (None if the line has none) and raw value of every property in the file.
+    entries = []
+    with open(file_path, 'r') as file:
+        for line in file:
+            l = line.strip()
+            if l and not l.startswith(comment_char):
+                key_value = l.split(separator)
+                splitted_key = key_value[0].strip().split(type_separator)
+
+                type_name = None
+                if len(splitted_key) > 1:
+                    type_name = splitted_key[-1]
+                    splitted_key = splitted_key[:-1]
+
+                entries.append((type_separator.join(splitted_key), type_name,
+                                separator.join(key_value[1:]).strip().strip('"')))
+    return entries
+
+
+def read_schema(file_path: str) -> Dict[str, Tuple[str, object]]:
+    # Type and default value of every property, in the order of the schema file.
+    schema = OrderedDict()
+    for key, type_name, raw in _read_properties(file_path):
+        type_name = type_name or 'str'
+        schema[key] = (type_name, CONVERTERS[type_name](raw))
+    return schema
+
+
 class Properties(Representable):
-    converters = {
-        'int': int,
-        'float': float,
-        'bool': lambda s: s.lower() == 'true',
-    }
+    converters = CONVERTERS
+
+    # Properties known to the formatter, see schema.properties.
+    SCHEMA = read_schema(SCHEMA_PATH)
+
+    __slots__ = ('map', '_hash') + tuple(SCHEMA)
 
     def __init__(self, file_path: str, separator='=', comment_char='#'):
-        with open(file_path, 'r') as file:
-            self.map = Properties._load_properties(file, separator, comment_char)
+        values = {}
+        for key, type_name, raw in _read_properties(file_path, separator, comment_char):
+            expected = Properties._schema_type(key, file_path)
+            if type_name is not None and type_name != expected:
+                raise ValueError('{}: property {} is {}, not {}.'.format(file_path, key, expected, type_name))
+            try:
+                values[key] = CONVERTERS[expected](raw)
+            except ValueError:
+                raise ValueError('{}: invalid {} value of property {}: {!r}.'.format(file_path, expected, key, raw))
+
+        self._compile(values, file_path)
+
+    @staticmethod
+    def from_map(values: Dict, origin: str = 'properties') -> 'Properties':
+        p = object.__new__(Properties)
+        p._compile(values, origin)
+        return p
 
-    def __getattr__(self, item: str):
-        return self.map.get(item)
+    def replace(self, **changes) -> 'Properties':
+        values = dict(self.map)
+        values.update(changes)
+        return Properties.from_map(values)
+
+    def _compile(self, values: Dict, origin: str):
+        compiled = OrderedDict()
+        for key, (type_name, default) in Properties.SCHEMA.items():
+            value = values.get(key, default)
+            # Defaults are read with CONVERTERS, so they have the type every value of the property must have.
+            expected = type(default)
+            if expected is float and type(value) is int:
+                value = float(value)
+            if type(value) is not expected:
+                raise ValueError('{}: property {} is {}, not {}.'.format(origin, key, type_name,
+                                                                         type(value).__name__))
+            compiled[key] = value
+            object.__setattr__(self, key, value)
+
+        for key in values:
+            Properties._schema_type(key, origin)
+
+        object.__setattr__(self, 'map', MappingProxyType(compiled))
+        object.__setattr__(self, '_hash', hash(tuple(compiled.values())))
+
+    @staticmethod
+    def _schema_type(key: str, origin: str) -> str:
+        if key not in Properties.SCHEMA:
+            raise ValueError('{}: unknown property {}.'.format(origin, key))
+        return Properties.SCHEMA[key][0]
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Properties are immutable, use replace().')
+
+    def __delattr__(self, key):
+        raise AttributeError('Properties are immutable, use replace().')
+
+    def __eq__(self, o: object) -> bool:
+        if isinstance(o, Properties):
+            return self.map == o.map
+        return False
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        return Properties.from_map, (dict(self.map),)
+
+    def _fields(self):
+        return self.map.items()
 
     @staticmethod
     def save_map_to_file(map: Dict, file_path: str):
@@ -58,29 +439,19 @@ class Properties(Representable):
             for key, value in map.items():
                 file.write('{}:{}={}\n'.format(key, type(value).__name__, value))
 
-    @staticmethod
-    def _load_properties(file, separator: str, comment_char: str, type_separator=':'):
-
-        properties = {}
-        for line in file:
-            l = line.strip()
-            if l and not l.startswith(comment_char):
-                key_value = l.split(separator)
-                key = key_value[0].strip()
-                splitted_key = key.split(type_separator)
 
-                value_convertor = str
-                if len(splitted_key) > 1:
-                    value_convertor = Properties.converters[splitted_key[-1]]
+TextEdit = namedtuple('TextEdit', ['offset', 'old', 'new'])
 
-                value = value_convertor(separator.join(key_value[1:]).strip().strip('"'))
-                properties[type_separator.join(splitted_key[:-1])] = value
+# First line that formatting would change, see Formatter.check. Line and column start at 1.
+Difference = namedtuple('Difference', ['line', 'column', 'original', 'formatted'])
 
-        return properties
+FileResult = namedtuple('FileResult', ['path', 'changed', 'errors', 'failure', 'stats', 'difference'],
+                        defaults=(None, None))
 
 
 class FormattingResult:
 
-    def __init__(self, code: str, errors: List[str]) -> None:
+    def __init__(self, code: Optional[str], errors: List[str], edits: Optional[List[TextEdit]] = None) -> None:
         self.code = code
-        self.errors = errors
\ No newline at end of file
+        self.errors = errors
+        self.edits = edits
\ No newline at end of file